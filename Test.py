@@ -1,14 +1,11 @@
-#List Image Models
-import requests
-
-url = "https://image.pollinations.ai/models"
-
-try:
-    response = requests.get(url)
-    response.raise_for_status()
-    models = response.json()
-    print("Available Image Models:")
-    for model in models:
-        print(f"- {model}")
-except requests.exceptions.RequestException as e:
-    print(f"Error fetching models: {e}")
\ No newline at end of file
+#List Image Models
+from models import get_catalogue
+
+catalogue = get_catalogue()
+# 缓存过期时向服务端重新验证（ETag/If-Modified-Since），否则直接使用缓存
+success, _ = catalogue.refresh()
+if not success:
+    print("Error fetching models, showing cached list")
+print("Available Image Models:")
+for model in catalogue.models:
+    print(f"- {model}")
\ No newline at end of file
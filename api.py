@@ -1,14 +1,105 @@
-import urllib.parse
+import hashlib
+import os
+import shutil
+import time
+import uuid
 import logging
 import requests
-from utils import setup_logging
+from cache import get_cache
+from client import get_client
+from generation import GenerationRequest
+from history import get_history
+from metrics import get_metrics
+from singleflight import SingleFlight
+from utils import generate_unique_filename
+
+_inflight = SingleFlight()
+
+
+def _record_metrics(params, stats, started, success, size=0, cache_hit=False):
+    """将一次请求的耗时、大小和状态记录到指标注册表"""
+    total = time.perf_counter() - started
+    record = dict(stats)
+    record.update(
+        model=params.get("model"),
+        width=params.get("width"),
+        height=params.get("height"),
+        success=success,
+        bytes=size,
+        cache_hit=cache_hit,
+        total=total,
+    )
+    if cache_hit:
+        record["status"] = "cache"
+    get_metrics().observe(record)
+
+
+def _record_history(prompt, params, started, success, result, path=None, content_hash=None, size=0):
+    """将一次调用写入历史索引（由后台线程批量写入，不阻塞调用方）"""
+    history = get_history()
+    if history is None:
+        return
+    latency = time.perf_counter() - started
+    if not success:
+        history.record(prompt, params, latency=latency, success=False, error=result)
+    elif path is not None:
+        history.record(prompt, params, path=path, content_hash=content_hash, size=size, latency=latency)
+    else:
+        history.record(prompt, params, size=len(result), latency=latency, data=result)
+
+
+def _open_part_file(path):
+    """在目标目录中创建临时文件，返回 (文件描述符, 临时路径)
+
+    与直接 open 创建的文件一样使用 0o666 并遵循 umask（tempfile.mkstemp 固定为 0o600，重命名后图像只有属主可读）。
+    """
+    directory = os.path.dirname(path) or "."
+    while True:
+        tmp_path = os.path.join(directory, f"{os.path.basename(path)}.{uuid.uuid4().hex[:8]}.part")
+        try:
+            return os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_BINARY", 0), 0o666), tmp_path
+        except FileExistsError:
+            continue
+
+
+def _fetch_image(request):
+    """查询缓存，未命中时请求 API 并写入缓存，返回 (成功标志, 图像数据或错误消息)"""
+    client = get_client()
+    path, params, cache_key = request.path, request.params, request.key
+    url = f"{client.base_url}{path}"
+    started = time.perf_counter()
+    
+    # 相同参数（含种子）的结果是确定的，命中缓存时不再请求网络
+    cache = get_cache()
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logging.info("命中缓存: %s, 参数: %s", url, params)
+            _record_metrics(params, {}, started, True, len(cached), cache_hit=True)
+            return True, cached
+    
+    stats = {}
+    try:
+        logging.info("发送 API 请求: %s, 参数: %s", url, params)
+        response = client.get(path, params=params, stats=stats)
+        logging.info("图像生成成功")
+        if cache is not None:
+            try:
+                cache.put(cache_key, response.content)
+            except OSError as e:
+                logging.warning("写入缓存失败: %s", e)
+        _record_metrics(params, stats, started, True, len(response.content))
+        return True, response.content
+    except requests.exceptions.RequestException as e:
+        logging.error("API 请求失败: %s", e)
+        _record_metrics(params, stats, started, False)
+        return False, f"错误: {str(e)}"
 
-# 初始化日志
-setup_logging()
 
 def generate_image(prompt, width, height, seed, referrer="", model="flux", nologo=True, enhance=False, private=False, safe=True):
     """
     调用 Pollinations AI API 生成图像，并返回图像数据或错误信息。
+    相同参数的并发调用会合并为一次请求，所有调用者得到相同的结果。
     
     参数:
         prompt (str): 图像描述文本
@@ -24,30 +115,177 @@ def generate_image(prompt, width, height, seed, referrer="", model="flux", nolog
     返回:
         tuple: (成功标志, 图像数据或错误消息)
     """
-    encoded_prompt = urllib.parse.quote(prompt)
-    url = f"https://image.pollinations.ai/prompt/{encoded_prompt}"
+    try:
+        request = GenerationRequest(prompt, width, height, seed, referrer, model, nologo, enhance, private, safe)
+    except ValueError as e:
+        logging.error("参数无效: %s", e)
+        return False, f"错误: {str(e)}"
+    return generate_request(request)
+
+
+def generate_request(request):
+    """
+    按已验证的 GenerationRequest 生成图像，返回值与 generate_image 相同。
+    批量调用方可以预先构建请求对象，避免每次调用重复验证和编码。
+    """
+    started = time.perf_counter()
+    success, result = _inflight.do(request.key, _fetch_image, request)
+    _record_history(request.prompt, request.params, started, success, result)
+    return success, result
+
+
+async def generate_image_async(prompt, width, height, seed, referrer="", model="flux", nologo=True, enhance=False, private=False, safe=True, executor=None):
+    """
+    generate_image 的异步版本，在线程池中执行阻塞的 HTTP 请求，复用共享客户端的连接池。
+    与线程调用共享进行中请求的合并。
     
-    params = {
-        "width": width,
-        "height": height,
-        "seed": seed,
-        "model": model,
-        "nologo": str(nologo).lower(),
-        "enhance": str(enhance).lower(),
-        "private": str(private).lower(),
-        "safe": str(safe).lower()
-    }
+    参数:
+        与 generate_image 相同
+        executor (concurrent.futures.Executor, optional): 执行请求的线程池，默认使用事件循环的默认线程池
+    
+    返回:
+        tuple: (成功标志, 图像数据或错误消息)
+    """
+    try:
+        request = GenerationRequest(prompt, width, height, seed, referrer, model, nologo, enhance, private, safe)
+    except ValueError as e:
+        logging.error("参数无效: %s", e)
+        return False, f"错误: {str(e)}"
+    return await generate_request_async(request, executor=executor)
+
 
-    # 如果referrer不为空，则添加到参数中
-    if referrer:
-        params["referrer"] = referrer
+async def generate_request_async(request, executor=None):
+    """generate_request 的异步版本，参数 executor 与 generate_image_async 相同"""
+    started = time.perf_counter()
+    success, result = await _inflight.do_async(request.key, _fetch_image, request, executor=executor)
+    _record_history(request.prompt, request.params, started, success, result)
+    return success, result
+
+
+def generate_image_to_file(prompt, width, height, seed, referrer="", model="flux", nologo=True, enhance=False, private=False, safe=True, path=None, progress_callback=None, chunk_size=64 * 1024):
+    """
+    调用 Pollinations AI API 生成图像，并以流方式直接写入磁盘，不在内存中保存完整的图像数据。
+    数据先写入目标目录中的临时文件，下载完成后原子地重命名为目标文件。相同参数的并发调用只下载一次。
     
+    参数:
+        与 generate_image 相同
+        path (str, optional): 保存路径，如果为None则自动生成（Images/ 目录）
+        progress_callback (callable, optional): 下载进度回调，参数为 (已下载字节数, 总字节数或None)，在调用线程中执行
+        chunk_size (int): 每次读取的字节数
+    
+    返回:
+        tuple: (成功标志, 保存路径或错误消息)
+    """
     try:
-        logging.info(f"发送 API 请求: {url}, 参数: {params}")
-        response = requests.get(url, params=params, timeout=300)
-        response.raise_for_status()
-        logging.info("图像生成成功")
-        return True, response.content
-    except requests.exceptions.RequestException as e:
-        logging.error(f"API 请求失败: {str(e)}")
-        return False, f"错误: {str(e)}"
\ No newline at end of file
+        request = GenerationRequest(prompt, width, height, seed, referrer, model, nologo, enhance, private, safe)
+    except ValueError as e:
+        logging.error("参数无效: %s", e)
+        return False, f"错误: {str(e)}"
+    return generate_request_to_file(request, path=path, progress_callback=progress_callback, chunk_size=chunk_size)
+
+
+def generate_request_to_file(request, path=None, progress_callback=None, chunk_size=64 * 1024):
+    """按已验证的 GenerationRequest 流式生成图像到文件，其他参数和返回值与 generate_image_to_file 相同
+
+    相同参数的并发调用只下载一次：第一个调用者流式写入自己的文件（并写入缓存），
+    其他调用者等待其完成后从缓存或该文件复制到各自的路径，下载进度只回调给第一个调用者。
+    """
+    allocated = path is None
+    if allocated:
+        path = generate_unique_filename()
+    started = time.perf_counter()
+    success, result, content_hash, size = _inflight.do(
+        f"file:{request.key}", _fetch_to_file, request, path, progress_callback, chunk_size)
+    if success and os.path.abspath(result) != os.path.abspath(path):
+        success, result = _copy_result(request, result, path)
+    if not success and allocated and os.path.exists(path):
+        # 释放自动分配的空文件
+        os.remove(path)
+    if success:
+        _record_history(request.prompt, request.params, started, True, path, path=path, content_hash=content_hash, size=size)
+    else:
+        _record_history(request.prompt, request.params, started, False, result)
+    return success, result
+
+
+def _copy_result(request, src, path):
+    """将合并的调用已下载的图像复制到 path（优先从缓存复制），返回 (成功标志, 路径或错误消息)"""
+    fd, tmp_path = _open_part_file(path)
+    os.close(fd)
+    try:
+        cache = get_cache()
+        if cache is None or not cache.copy_to(request.key, tmp_path):
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, path)
+        return True, path
+    except OSError as e:
+        logging.error("复制合并请求的图像失败: %s", e)
+        return False, f"错误: {str(e)}"
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _fetch_to_file(request, path, progress_callback, chunk_size):
+    """查询缓存，未命中时流式下载到 path 并写入缓存
+
+    返回:
+        tuple: (成功标志, 保存路径或错误消息, 内容哈希（未知时为 None）, 字节数)
+    """
+    request_path, params, cache_key = request.path, request.params, request.key
+    client = get_client()
+    url = f"{client.base_url}{request_path}"
+    started = time.perf_counter()
+    stats = {}
+    fd, tmp_path = _open_part_file(path)
+    try:
+        cache = get_cache()
+        if cache is not None:
+            os.close(fd)
+            fd = None
+            if cache.copy_to(cache_key, tmp_path):
+                logging.info("命中缓存: %s, 参数: %s", url, params)
+                os.replace(tmp_path, path)
+                size = os.path.getsize(path)
+                _record_metrics(params, {}, started, True, size, cache_hit=True)
+                return True, path, None, size
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_TRUNC)
+        
+        logging.info("发送 API 请求（流式下载）: %s, 参数: %s", url, params)
+        response = client.get(request_path, params=params, stream=True, stats=stats)
+        download_started = time.perf_counter()
+        total = response.headers.get("Content-Length")
+        total = int(total) if total and total.isdigit() else None
+        digest = hashlib.sha256()
+        downloaded = 0
+        with response, os.fdopen(fd, "wb") as f:
+            fd = None
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if not chunk:
+                    continue
+                f.write(chunk)
+                digest.update(chunk)
+                downloaded += len(chunk)
+                if progress_callback is not None:
+                    progress_callback(downloaded, total)
+        stats["download"] = time.perf_counter() - download_started
+        os.replace(tmp_path, path)
+        logging.info("图像生成成功并已写入: %s (%d 字节)", path, downloaded)
+    except (requests.exceptions.RequestException, OSError) as e:
+        logging.error("API 请求失败: %s", e)
+        _record_metrics(params, stats, started, False)
+        return False, f"错误: {str(e)}", None, 0
+    finally:
+        if fd is not None:
+            os.close(fd)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    # 图像已保存成功，写入缓存失败（例如缓存目录所在磁盘已满）不影响结果
+    if cache is not None:
+        try:
+            cache.put_file(cache_key, path, digest.hexdigest(), downloaded)
+        except OSError as e:
+            logging.warning("写入缓存失败: %s", e)
+    _record_metrics(params, stats, started, True, downloaded)
+    return True, path, digest.hexdigest(), downloaded
@@ -0,0 +1,131 @@
+# 批量图像生成引擎：有界并发、按主机限速，结果逐个写入磁盘
+import asyncio
+import logging
+import os
+import time
+import urllib.parse
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+from api import generate_request_to_file
+from client import get_client
+from generation import GenerationRequest
+from ratelimit import PRIORITY_BATCH, set_priority
+
+
+class AsyncRateLimiter:
+    """按主机限速：同一主机两次请求之间至少间隔 1/rate 秒"""
+
+    def __init__(self, rate):
+        """
+        参数:
+            rate (float): 每秒允许的最大请求数，为 None 或 0 时不限速
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_time = {}
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, host):
+        """等待直到 host 可以发送下一个请求"""
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time.get(host, now))
+            self._next_time[host] = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+def _split_spec(spec):
+    """将任务描述转换为 (GenerationRequest, 输出路径或 None)
+
+    任务可以是 GenerationRequest，可以是 dict（如 {"prompt": ..., "width": ..., "seed": ..., "model": ...}），
+    也可以是按 generate_image 参数顺序排列的元组 (prompt, width, height, seed, ...)。
+    dict 中的 "path" 键指定输出文件路径；"request" 键可直接给出已构建的 GenerationRequest。
+
+    异常:
+        ValueError: 参数无效
+    """
+    if isinstance(spec, GenerationRequest):
+        return spec, None
+    if isinstance(spec, Mapping):
+        request = spec.get("request")
+        if request is None:
+            request = GenerationRequest.from_dict(spec)
+        return request, spec.get("path")
+    return GenerationRequest(*spec), None
+
+
+async def run_batch(specs, output_dir="Images", concurrency=8, rate_limit=None, on_result=None):
+    """并发执行批量生成任务
+
+    任务从 specs 中按需读取，同一时间最多 concurrency 个请求在进行；
+    每个任务的图像以流方式直接写入输出文件（历史记录中保存该路径），不会把结果保存在内存中。
+
+    参数:
+        specs (iterable): 任务描述的可迭代对象，见 _split_spec
+        output_dir (str): 未指定 "path" 时的输出目录，文件名为 batch_<序号>.jpg
+        concurrency (int): 最大并发请求数（建议不超过客户端连接池大小 pool_size）
+        rate_limit (float, optional): 每个主机每秒的最大请求数
+        on_result (callable, optional): 每个任务完成后调用，参数为结果 dict：
+            index, success, path 或 error, bytes, latency
+
+    返回:
+        dict: 汇总信息 {"total", "succeeded", "failed", "elapsed"}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    host = urllib.parse.urlsplit(get_client().base_url).netloc
+    limiter = AsyncRateLimiter(rate_limit)
+    semaphore = asyncio.Semaphore(concurrency)
+    summary = {"total": 0, "succeeded": 0, "failed": 0}
+    started = time.monotonic()
+    loop = asyncio.get_running_loop()
+
+    async def run_one(index, spec, executor):
+        try:
+            request, path = _split_spec(spec)
+            await limiter.acquire(host)
+            path = path or os.path.join(output_dir, f"batch_{index:06d}.jpg")
+            t0 = time.monotonic()
+            # 请求和文件写入都在线程池中执行，不阻塞事件循环
+            success, result = await loop.run_in_executor(executor, generate_request_to_file, request, path)
+            latency = time.monotonic() - t0
+            record = {"index": index, "success": success, "latency": round(latency, 3)}
+            if success:
+                record["path"] = result
+                record["bytes"] = os.path.getsize(result)
+            else:
+                record["error"] = result
+        except Exception as e:
+            logging.error("批量任务 %d 失败: %s", index, e)
+            record = {"index": index, "success": False, "error": str(e)}
+        finally:
+            semaphore.release()
+
+        summary["succeeded" if record["success"] else "failed"] += 1
+        if on_result is not None:
+            on_result(record)
+
+    # 批量任务的请求优先级低于界面请求，共享限速器时界面请求先获得令牌
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch",
+                            initializer=set_priority, initargs=(PRIORITY_BATCH,)) as executor:
+        tasks = set()
+        for index, spec in enumerate(specs):
+            # 先获取信号量再创建任务，保证待执行任务数有界
+            await semaphore.acquire()
+            summary["total"] += 1
+            task = asyncio.create_task(run_one(index, spec, executor))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    summary["elapsed"] = round(time.monotonic() - started, 3)
+    logging.info(f"批量生成完成: {summary}")
+    return summary
+
+
+def generate_batch(specs, **kwargs):
+    """run_batch 的同步封装，参数同 run_batch"""
+    return asyncio.run(run_batch(specs, **kwargs))
@@ -0,0 +1,309 @@
+# 本地性能基准：模拟 image.pollinations.ai 的桩服务器，测量生成、保存、文件命名和预览缩放的性能
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块，峰值内存改用 psutil（未安装时不统计）
+    resource = None
+
+BASELINE_DIR = "benchmarks"
+
+
+class StubSettings:
+    """桩服务器的行为参数"""
+
+    def __init__(self, latency=0.05, payload_size=256 * 1024, error_rate=0.0, throttle_rate=0.0):
+        """
+        参数:
+            latency (float): 每个请求的固定延迟（秒）
+            payload_size (int): 返回的图像数据大小（字节）
+            error_rate (float): 返回 500 的概率
+            throttle_rate (float): 返回 429（Retry-After: 0）的概率
+        """
+        self.latency = latency
+        self.payload_size = payload_size
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        # 以 JPEG 文件头开头的固定数据，内容本身不需要可解码
+        self.payload = b"\xff\xd8\xff\xe0" + os.urandom(max(0, payload_size - 4))
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        settings = self.server.settings
+        time.sleep(settings.latency)
+        roll = random.random()
+        if roll < settings.throttle_rate:
+            self._send(429, b"Too Many Requests", "text/plain", {"Retry-After": "0"})
+        elif roll < settings.throttle_rate + settings.error_rate:
+            self._send(500, b"Internal Server Error", "text/plain")
+        elif self.path.startswith("/models"):
+            self._send(200, json.dumps(["flux", "turbo", "gptimage", "kontext"]).encode(), "application/json")
+        elif self.path.startswith("/prompt/"):
+            self._send(200, settings.payload, "image/jpeg")
+        else:
+            self._send(404, b"Not Found", "text/plain")
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer:
+    """在后台线程中运行的本地桩服务器"""
+
+    def __init__(self, settings=None, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), _StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.settings = settings or StubSettings()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def percentiles(samples):
+    """返回样本的 p50/p95/p99 以及平均值（秒）"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))], 6)
+
+    return {"p50": pick(50), "p95": pick(95), "p99": pick(99), "mean": round(sum(ordered) / len(ordered), 6)}
+
+
+def peak_rss_mb():
+    """返回进程峰值常驻内存（MB），无法获取时返回 None"""
+    if resource is None:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        # Windows 的 peak_wset 为峰值工作集，其他平台退化为当前常驻内存
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 2)
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以 KB 为单位
+    return round(usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024, 2)
+
+
+def run_scenario(name, func, count, concurrency=1):
+    """执行 count 次 func(i)，返回吞吐量和延迟分位数"""
+    latencies = []
+    failures = 0
+    lock = threading.Lock()
+
+    def timed(i):
+        nonlocal failures
+        start = time.perf_counter()
+        ok = func(i)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if ok is False:
+                failures += 1
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        for i in range(count):
+            timed(i)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(timed, range(count)))
+    wall = time.perf_counter() - started
+    result = {
+        "name": name,
+        "count": count,
+        "concurrency": concurrency,
+        "failures": failures,
+        "wall_seconds": round(wall, 6),
+        "throughput_per_second": round(count / wall, 3) if wall else None,
+        "latency": percentiles(latencies),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print(f"{name:<40} {result['throughput_per_second']:>10} ops/s  p50 {result['latency']['p50']:.4f}s  "
+          f"p95 {result['latency']['p95']:.4f}s  失败 {failures}")
+    return result
+
+
+def bench_generate(workdir, base_url, count, concurrency):
+    """api.generate_image 的吞吐量（关闭缓存，每次使用不同种子，历史记录写入临时目录）"""
+    import api
+    import cache
+    import client
+    import history
+
+    client._client = client.PollinationsClient(base_url=base_url, pool_size=max(concurrency, 1), backoff_factor=0.01)
+    cache._cache = False
+    if not history._history:
+        # 保留历史记录的开销，但不写入用户的 cache/history.sqlite
+        history._history = history.HistoryIndex(os.path.join(workdir, "history.sqlite"))
+
+    def call(i):
+        success, _ = api.generate_image("benchmark prompt", 1024, 1024, i)
+        return success
+
+    suffix = "sequential" if concurrency == 1 else f"concurrent x{concurrency}"
+    return run_scenario(f"generate_image ({suffix})", call, count, concurrency)
+
+
+def bench_save_image(workdir, payload, count, concurrency):
+    """utils.save_image 自动命名保存的吞吐量"""
+    import utils
+
+    utils._filename_allocator = utils._SequenceAllocator(os.path.join(workdir, "Images"))
+
+    def call(i):
+        success, _ = utils.save_image(payload)
+        return success
+
+    suffix = "sequential" if concurrency == 1 else f"concurrent x{concurrency}"
+    return run_scenario(f"save_image ({suffix})", call, count, concurrency)
+
+
+def bench_unique_filename(workdir, count, concurrency):
+    """utils.generate_unique_filename 在目录中已有大量文件时的耗时"""
+    import utils
+
+    directory = os.path.join(workdir, "Names")
+    utils._filename_allocator = utils._SequenceAllocator(directory)
+
+    suffix = "sequential" if concurrency == 1 else f"concurrent x{concurrency}"
+    return run_scenario(f"generate_unique_filename ({suffix})", lambda i: bool(utils.generate_unique_filename()), count, concurrency)
+
+
+def bench_preview(workdir, count, size=4096):
+    """GUI 预览缩放路径（仅使用 Pillow）：解码一次后连续缩放到不同的窗口尺寸"""
+    from preview import PreviewSource
+
+    path = os.path.join(workdir, "preview.jpg")
+    Image.new("RGB", (size, size), (40, 120, 200)).save(path, quality=90)
+    source = PreviewSource(path, (1920, 1080))
+    sizes = [(600 + (i * 37) % 800, 400 + (i * 23) % 500) for i in range(count)]
+    decode = run_scenario(f"preview decode ({size}px)", lambda i: bool(PreviewSource(path, (1920, 1080))), max(1, count // 10))
+    resize = run_scenario(f"preview resize ({size}px)", lambda i: bool(source.render(*sizes[i])), count)
+    return [decode, resize]
+
+
+def bench_request_build(count):
+    """批量展开同一提示词的种子变体：验证参数、编码请求路径并计算缓存键"""
+    from generation import GenerationRequest
+
+    base = GenerationRequest("benchmark prompt, highly detailed, 8k", 1024, 1024, 0)
+    return run_scenario("GenerationRequest.replace + key", lambda i: bool(base.replace(seed=i).key), count)
+
+
+def compare(results, baseline_path, tolerance):
+    """与基准文件比较吞吐量，返回退化的场景列表"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {item["name"]: item for item in json.load(f)["results"]}
+    regressions = []
+    for item in results:
+        old = baseline.get(item["name"])
+        if not old or not old.get("throughput_per_second") or not item.get("throughput_per_second"):
+            continue
+        ratio = item["throughput_per_second"] / old["throughput_per_second"]
+        if ratio < 1 - tolerance:
+            regressions.append({"name": item["name"], "baseline": old["throughput_per_second"],
+                                "current": item["throughput_per_second"], "ratio": round(ratio, 3)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pollinations.AI 图像生成器本地性能基准")
+    parser.add_argument("-n", "--count", type=int, default=200, help="每个场景的操作次数")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="并发场景的线程数")
+    parser.add_argument("--latency", type=float, default=0.05, help="桩服务器延迟（秒）")
+    parser.add_argument("--payload-kb", type=int, default=256, help="桩服务器返回的图像大小（KB）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="桩服务器返回 500 的概率")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="桩服务器返回 429 的概率")
+    parser.add_argument("--save", metavar="NAME", help=f"将结果保存为 {BASELINE_DIR}/NAME.json 基准")
+    parser.add_argument("--compare", metavar="NAME", help=f"与 {BASELINE_DIR}/NAME.json 基准比较")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的吞吐量下降比例（默认 0.2）")
+    args = parser.parse_args(argv)
+
+    # 基准测试期间只输出警告和错误，避免逐条请求日志影响测量
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    settings = StubSettings(args.latency, args.payload_kb * 1024, args.error_rate, args.throttle_rate)
+    workdir = tempfile.mkdtemp(prefix="pollinations_bench_")
+    results = []
+    try:
+        with StubServer(settings) as server:
+            results.append(bench_generate(workdir, server.base_url, args.count, 1))
+            results.append(bench_generate(workdir, server.base_url, args.count, args.concurrency))
+        results.append(bench_save_image(workdir, settings.payload, args.count, 1))
+        results.append(bench_save_image(workdir, settings.payload, args.count, args.concurrency))
+        results.append(bench_unique_filename(workdir, args.count * 5, 1))
+        results.append(bench_unique_filename(workdir, args.count * 5, args.concurrency))
+        results.extend(bench_preview(workdir, args.count))
+        results.append(bench_request_build(args.count * 50))
+    finally:
+        if "history" in sys.modules and sys.modules["history"]._history:
+            sys.modules["history"]._history.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "settings": {"latency": args.latency, "payload_kb": args.payload_kb, "error_rate": args.error_rate,
+                     "throttle_rate": args.throttle_rate, "count": args.count, "concurrency": args.concurrency},
+        "peak_rss_mb": peak_rss_mb(),
+        "results": results,
+    }
+    if report["peak_rss_mb"] is not None:
+        print(f"峰值内存: {report['peak_rss_mb']} MB")
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基准已保存: {path}")
+
+    if args.compare:
+        regressions = compare(results, os.path.join(BASELINE_DIR, f"{args.compare}.json"), args.tolerance)
+        for item in regressions:
+            print(f"性能退化: {item['name']} {item['baseline']} -> {item['current']} ops/s ({item['ratio']:.0%})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
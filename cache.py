@@ -0,0 +1,333 @@
+# 图像结果缓存：按请求参数哈希索引，按内容哈希存储，超过容量时按 LRU 淘汰
+import atexit
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from utils import load_config
+
+# 未被索引引用的数据文件和临时文件超过该时间（秒）后视为残留（进程崩溃或其他进程尚未写回索引），启动时删除
+ORPHAN_AGE = 600
+
+
+def make_cache_key(prompt, params):
+    """根据提示词和请求参数生成稳定的缓存键
+
+    参数按键名排序后序列化，保证相同的参数组合得到相同的键。
+    """
+    canonical = json.dumps({"prompt": prompt, "params": params}, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """跨进程的排他文件锁，多个进程共用同一缓存目录时串行化索引的读取-合并-写入"""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ResultCache:
+    """磁盘结果缓存
+
+    目录结构:
+        <cache_dir>/index.json      请求键 -> 内容哈希、大小、最后访问时间（按 LRU 顺序）
+        <cache_dir>/blobs/<hash>    图像数据，相同内容只存一份
+
+    锁只保护内存中的索引，图像数据的读取、复制和写入都在锁外进行，多个请求可以同时读写缓存。
+    索引（包括访问时间）在变化后延迟 flush_interval 秒写回磁盘，进程退出时再写一次。
+    多个进程（界面、batch、serve）可以共用同一目录：写回时在文件锁下与磁盘上的索引合并，
+    并接收其他进程新增的条目；启动时删除不被索引引用的残留数据文件，总大小始终受 max_bytes 限制。
+    """
+
+    def __init__(self, cache_dir="cache", max_bytes=512 * 1024 * 1024, flush_interval=5.0):
+        """
+        参数:
+            cache_dir (str): 缓存目录
+            max_bytes (int): 图像数据总大小上限（字节）
+            flush_interval (float): 索引变化后延迟写回的时间（秒）
+        """
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.lock_path = os.path.join(cache_dir, "index.lock")
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> {"hash", "size", "atime"}，最近使用的在末尾
+        self._refs = {}  # 内容哈希 -> 引用该内容的键数量
+        self._removed = set()  # 上次写回后本进程移除的键，合并时不从磁盘索引中恢复
+        self._total_bytes = 0
+        self._dirty = False
+        self._flush_timer = None
+        self._save_lock = threading.Lock()  # 串行化索引文件的写入
+        os.makedirs(self.blob_dir, exist_ok=True)
+        with _file_lock(self.lock_path):
+            self._load_index()
+            self._remove_orphans()
+        atexit.register(self.flush)
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.blob_dir, content_hash)
+
+    def _read_index(self):
+        """读取磁盘上的索引，返回 key -> 条目"""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("entries", {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.error(f"缓存索引读取失败，将重建: {str(e)}")
+            return {}
+
+    def _load_index(self):
+        """读取索引文件，忽略对应数据已丢失的条目（调用方需持有文件锁）"""
+        entries = sorted(self._read_index().items(), key=lambda item: item[1].get("atime", 0))
+        for key, entry in entries:
+            if os.path.exists(self._blob_path(entry["hash"])):
+                self._add_entry(key, entry)
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            self._remove_entry(next(iter(self._entries)))
+
+    def _remove_orphans(self):
+        """删除不被索引引用的残留数据文件和临时文件（调用方需持有文件锁）
+
+        其他进程刚写入、尚未写回索引的数据文件较新，只删除超过 ORPHAN_AGE 的文件。
+        """
+        cutoff = time.time() - ORPHAN_AGE
+        for directory in (self.blob_dir, self.cache_dir):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    stray = entry.name.endswith(".tmp") or (directory == self.blob_dir and entry.name not in self._refs)
+                    try:
+                        if stray and entry.stat().st_mtime < cutoff:
+                            os.remove(entry.path)
+                    except OSError:
+                        pass
+
+    def _save_index(self, entries):
+        """原子地写入索引文件（调用方需持有 _save_lock 和文件锁）"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"entries": entries}, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logging.error(f"缓存索引写入失败: {str(e)}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _mark_dirty(self):
+        """标记索引已变化，并安排延迟写回（调用方需持有锁）"""
+        self._dirty = True
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _add_entry(self, key, entry):
+        self._entries[key] = entry
+        refs = self._refs.get(entry["hash"], 0)
+        if refs == 0:
+            self._total_bytes += entry["size"]
+        self._refs[entry["hash"]] = refs + 1
+
+    def _remove_entry(self, key):
+        entry = self._entries.pop(key)
+        self._removed.add(key)
+        refs = self._refs[entry["hash"]] - 1
+        if refs:
+            self._refs[entry["hash"]] = refs
+            return
+        del self._refs[entry["hash"]]
+        self._total_bytes -= entry["size"]
+        try:
+            os.remove(self._blob_path(entry["hash"]))
+        except OSError:
+            pass
+
+    def _lookup(self, key):
+        """查找条目并更新访问顺序，返回内容哈希，未命中时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry["atime"] = time.time()
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._mark_dirty()
+            return entry["hash"]
+
+    def _discard(self, key, content_hash):
+        """数据文件读取失败（已丢失或刚被淘汰）时移除条目，并把命中改记为未命中"""
+        with self._lock:
+            self.hits -= 1
+            self.misses += 1
+            entry = self._entries.get(key)
+            if entry is not None and entry["hash"] == content_hash:
+                self._remove_entry(key)
+                self._mark_dirty()
+
+    def get(self, key):
+        """读取缓存，未命中时返回 None"""
+        content_hash = self._lookup(key)
+        if content_hash is None:
+            return None
+        try:
+            with open(self._blob_path(content_hash), "rb") as f:
+                return f.read()
+        except OSError:
+            self._discard(key, content_hash)
+            return None
+
+    def copy_to(self, key, dest_path):
+        """将缓存的图像复制到 dest_path，不经过内存中的 bytes
+
+        返回:
+            bool: 是否命中缓存
+        """
+        content_hash = self._lookup(key)
+        if content_hash is None:
+            return False
+        try:
+            shutil.copyfile(self._blob_path(content_hash), dest_path)
+        except OSError:
+            self._discard(key, content_hash)
+            return False
+        return True
+
+    def put(self, key, data):
+        """写入缓存，并在超过容量时淘汰最久未使用的条目"""
+        def write_blob(blob_path):
+            fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, blob_path)
+
+        self._store(key, hashlib.sha256(data).hexdigest(), len(data), write_blob)
+
+    def put_file(self, key, src_path, content_hash, size):
+        """将已写入磁盘的图像文件加入缓存
+
+        参数:
+            content_hash (str): 文件内容的 sha256 十六进制摘要（下载时增量计算）
+            size (int): 文件大小（字节）
+        """
+        def write_blob(blob_path):
+            fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, suffix=".tmp")
+            os.close(fd)
+            shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, blob_path)
+
+        self._store(key, content_hash, size, write_blob)
+
+    def _store(self, key, content_hash, size, write_blob):
+        if size > self.max_bytes:
+            return
+        blob_path = self._blob_path(content_hash)
+        with self._lock:
+            exists = content_hash in self._refs
+        # 数据按内容寻址，同时写入相同内容的线程会原子地替换为相同的文件
+        if not exists and not os.path.exists(blob_path):
+            write_blob(blob_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["hash"] == content_hash:
+                entry["atime"] = time.time()
+                self._entries.move_to_end(key)
+            else:
+                if entry is not None:
+                    self._remove_entry(key)
+                self._add_entry(key, {"hash": content_hash, "size": size, "atime": time.time()})
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                self._remove_entry(next(iter(self._entries)))
+            self._mark_dirty()
+
+    def flush(self):
+        """在文件锁下与磁盘上的索引合并，并写回条目和访问顺序（没有变化时不写）
+
+        其他进程写入的条目被合并到本进程的索引中（本进程已淘汰的除外），合并后超过容量时按 LRU 淘汰。
+        """
+        with self._save_lock:
+            with self._lock:
+                self._flush_timer = None
+                if not self._dirty:
+                    return
+            with _file_lock(self.lock_path):
+                # 数据文件是否存在在锁外检查
+                others = {key: entry for key, entry in self._read_index().items()
+                          if key not in self._entries and os.path.exists(self._blob_path(entry["hash"]))}
+                with self._lock:
+                    for key, entry in others.items():
+                        if key not in self._entries and key not in self._removed:
+                            self._add_entry(key, entry)
+                    if others:
+                        ordered = sorted(self._entries.items(), key=lambda item: item[1].get("atime", 0))
+                        self._entries = OrderedDict(ordered)
+                        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                            self._remove_entry(next(iter(self._entries)))
+                    self._removed.clear()
+                    self._dirty = False
+                    entries = {key: dict(entry) for key, entry in self._entries.items()}
+                self._save_index(entries)
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """返回进程内共享的缓存实例，config.json 中 cache_enabled 为 false 时返回 None"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = load_config()
+                if config.get("cache_enabled", True):
+                    _cache = ResultCache(
+                        cache_dir=config.get("cache_dir", "cache"),
+                        max_bytes=int(config.get("cache_max_mb", 512) * 1024 * 1024),
+                    )
+                else:
+                    _cache = False
+    return _cache or None
@@ -0,0 +1,237 @@
+# 命令行入口，无需图形界面即可批量生成图像
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+from utils import load_config, setup_logging
+
+# 任务中可以省略、从 config.json 的 default_* 读取默认值的参数
+DEFAULT_FIELDS = ("width", "height", "model", "nologo", "enhance", "private", "safe")
+
+# 任务中允许出现的生成参数
+JOB_FIELDS = ("prompt", "width", "height", "seed", "referrer", "model", "nologo", "enhance", "private", "safe")
+
+
+def read_completed_lines(results_path):
+    """读取已有的结果文件，返回已完成（成功或任务本身无效）的任务行号集合"""
+    completed = set()
+    if not os.path.exists(results_path):
+        return completed
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 崩溃时可能留下不完整的最后一行
+                continue
+            if record.get("status") in ("ok", "invalid"):
+                completed.add(record["line"])
+    return completed
+
+
+def _ends_with_newline(path):
+    """文件最后一个字节是否为换行符"""
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def build_job(raw, config):
+    """将一行任务 JSON 转换为已验证的 GenerationRequest，缺省值取自 config.json
+
+    异常:
+        ValueError: 任务缺少 prompt 或参数无效，该行会被记录为 invalid
+    """
+    from generation import GenerationRequest
+
+    if not isinstance(raw, dict) or not raw.get("prompt"):
+        raise ValueError("任务缺少 prompt 字段")
+    job = {key: raw[key] for key in JOB_FIELDS if key in raw}
+    for key in DEFAULT_FIELDS:
+        default_key = f"default_{key}"
+        if key not in job and default_key in config:
+            job[key] = config[default_key]
+    job.setdefault("seed", 42)
+    return GenerationRequest.from_dict(job)
+
+
+def run_jsonl_batch(jobs_path, results_path=None, output_dir="Images", concurrency=4, rate_limit=None):
+    """逐行读取 JSONL 任务文件并行生成图像，结果逐行追加到结果文件
+
+    已在结果文件中标记为成功的行会被跳过，因此中断后重新运行即可继续。
+
+    参数:
+        jobs_path (str): 任务文件，每行一个 JSON 对象（prompt 必填，其余参数可选）
+        results_path (str, optional): 结果文件，默认为 <任务文件名>.results.jsonl
+        output_dir (str): 图像输出目录
+        concurrency (int): 最大并发请求数
+        rate_limit (float, optional): 每秒最大请求数
+
+    返回:
+        dict: 汇总信息
+    """
+    # 批量模式依赖异步引擎，在需要时才导入，避免 --help 等命令初始化网络客户端
+    from batch import run_batch
+
+    config = load_config()
+    if results_path is None:
+        results_path = f"{os.path.splitext(jobs_path)[0]}.results.jsonl"
+    stem = os.path.splitext(os.path.basename(jobs_path))[0]
+    completed = read_completed_lines(results_path)
+    if completed:
+        logging.info(f"跳过已完成的 {len(completed)} 个任务")
+
+    pending = {}  # run_batch 序号 -> (行号, 任务 id)
+    skipped = {"invalid": 0, "skipped": len(completed)}
+
+    with open(results_path, "a", encoding="utf-8") as results:
+        if results.tell() and not _ends_with_newline(results_path):
+            # 上次运行崩溃时留下的不完整行单独成行，避免与下一条结果拼接后一起被丢弃
+            results.write("\n")
+
+        def write_result(record):
+            results.write(json.dumps(record, ensure_ascii=False) + "\n")
+            results.flush()
+
+        def specs():
+            with open(jobs_path, "r", encoding="utf-8") as f:
+                for line_no, line in enumerate(f, 1):
+                    if line_no in completed or not line.strip():
+                        continue
+                    try:
+                        raw = json.loads(line)
+                        request = build_job(raw, config)
+                    except ValueError as e:
+                        skipped["invalid"] += 1
+                        write_result({"line": line_no, "status": "invalid", "error": str(e)})
+                        continue
+                    path = os.path.join(output_dir, f"{stem}_{line_no:06d}.jpg")
+                    yield line_no, raw.get("id"), {"request": request, "path": path}
+
+        def on_result(record):
+            line_no, job_id = pending.pop(record["index"])
+            result = {"line": line_no, "status": "ok" if record["success"] else "error"}
+            if job_id is not None:
+                result["id"] = job_id
+            for key in ("path", "bytes", "latency", "error"):
+                if key in record:
+                    result[key] = record[key]
+            write_result(result)
+
+        def tracked_specs():
+            for index, (line_no, job_id, job) in enumerate(specs()):
+                pending[index] = (line_no, job_id)
+                yield job
+
+        summary = asyncio.run(run_batch(
+            tracked_specs(), output_dir=output_dir, concurrency=concurrency,
+            rate_limit=rate_limit, on_result=on_result
+        ))
+    summary.update(skipped)
+    summary["results"] = results_path
+    return summary
+
+
+def run_export(args):
+    """执行 export 命令：所有图像作为一批提交到后处理进程池"""
+    from postprocess import make_job, process_batch
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = [
+        make_job(src, os.path.join(args.output_dir, f"{os.path.splitext(os.path.basename(src))[0]}.{args.format}"),
+                 quality=args.quality, max_size=args.max_size, thumbnail=args.thumbnail)
+        for src in args.images
+    ]
+    results = process_batch(jobs, max_workers=args.workers)
+    failed = [result for success, result in results if not success]
+    print(json.dumps({"total": len(jobs), "succeeded": len(jobs) - len(failed), "failed": len(failed)}, ensure_ascii=False))
+    return 0 if not failed else 1
+
+
+def run_history(args):
+    """执行 history 命令"""
+    from history import get_history
+
+    history = get_history()
+    if history is None:
+        print("历史记录未启用（config.json 中的 history_enabled）", file=sys.stderr)
+        return 1
+    history.backfill(args.log_dir)
+    for row in history.search(" ".join(args.query), limit=args.limit):
+        if args.json:
+            print(json.dumps(row, ensure_ascii=False))
+        else:
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row["created"]))
+            print(f"{created}  seed={row['seed']}  {row['width']}x{row['height']}  {row['model']}  "
+                  f"{row['path'] or ('失败' if row['success'] == 0 else '-')}  {row['prompt']}")
+    return 0
+
+
+def main(argv=None):
+    """解析命令行参数并执行对应命令"""
+    config = load_config()
+    parser = argparse.ArgumentParser(prog="main.py", description="Pollinations.AI 图像生成器命令行")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = subparsers.add_parser("batch", help="按 JSONL 任务文件批量生成图像")
+    batch_parser.add_argument("jobs", help="任务文件，每行一个 JSON 对象")
+    batch_parser.add_argument("-o", "--results", help="结果文件路径（默认 <任务文件名>.results.jsonl）")
+    batch_parser.add_argument("-d", "--output-dir", default="Images", help="图像输出目录（默认 Images）")
+    batch_parser.add_argument("-c", "--concurrency", type=int, default=config.get("max_workers", 4), help="最大并发请求数")
+    batch_parser.add_argument("--rate", type=float, default=None, help="每秒最大请求数")
+    batch_parser.add_argument("--metrics", help="完成后将请求指标写入该文件（.prom 为 Prometheus 文本格式，其他为 JSON）")
+
+    export_parser = subparsers.add_parser("export", help="在进程池中批量转换图像格式、缩小尺寸并生成缩略图")
+    export_parser.add_argument("images", nargs="+", help="源图像文件")
+    export_parser.add_argument("-d", "--output-dir", default="Exports", help="输出目录（默认 Exports）")
+    export_parser.add_argument("-f", "--format", choices=["jpg", "png", "webp"], default="webp", help="输出格式（默认 webp）")
+    export_parser.add_argument("-q", "--quality", type=int, default=config.get("export_quality", 90), help="JPEG/WebP 质量")
+    export_parser.add_argument("--max-size", type=int, default=config.get("export_max_size"), help="输出图像最长边上限（像素）")
+    export_parser.add_argument("--thumbnail", type=int, default=None, help="额外生成最长边为该值的缩略图")
+    export_parser.add_argument("-j", "--workers", type=int, default=None, help="进程数（默认按 CPU 核数）")
+
+    history_parser = subparsers.add_parser("history", help="搜索生成历史（先从日志增量回填）")
+    history_parser.add_argument("query", nargs="*", help="提示词关键词，留空时显示最近的记录")
+    history_parser.add_argument("-n", "--limit", type=int, default=20, help="最多显示的记录数")
+    history_parser.add_argument("--log-dir", default="logs", help="回填使用的日志目录（默认 logs）")
+    history_parser.add_argument("--json", action="store_true", help="以 JSON Lines 格式输出")
+
+    serve_parser = subparsers.add_parser("serve", help="启动本地 HTTP 服务，供其他程序共享生成接口")
+    serve_parser.add_argument("--host", default=config.get("server_host", "127.0.0.1"), help="监听地址（默认 127.0.0.1）")
+    serve_parser.add_argument("-p", "--port", type=int, default=config.get("server_port", 8765), help="监听端口（默认 8765）")
+    serve_parser.add_argument("-c", "--concurrency", type=int, default=config.get("server_max_concurrency", 16),
+                              help="同时向上游请求的最大生成数")
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        from server import serve
+        serve(args.host, args.port, max_concurrency=args.concurrency, config=config)
+        return 0
+    if args.command == "export":
+        return run_export(args)
+    if args.command == "history":
+        return run_history(args)
+    if args.command == "batch":
+        summary = run_jsonl_batch(
+            args.jobs, results_path=args.results, output_dir=args.output_dir,
+            concurrency=args.concurrency, rate_limit=args.rate
+        )
+        print(json.dumps(summary, ensure_ascii=False))
+        if args.metrics:
+            from metrics import get_metrics
+            if args.metrics.endswith(".prom"):
+                with open(args.metrics, "w", encoding="utf-8") as f:
+                    f.write(get_metrics().to_prometheus())
+            else:
+                get_metrics().write_snapshot(args.metrics)
+        return 0 if summary["failed"] == 0 else 1
+    return 2
+
+
+if __name__ == "__main__":
+    setup_logging()
+    sys.exit(main())
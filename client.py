@@ -0,0 +1,223 @@
+# Pollinations.AI HTTP 客户端，复用连接池并在限流/服务端错误时自动重试
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from ratelimit import get_limiter
+from utils import load_config
+
+DEFAULT_BASE_URL = "https://image.pollinations.ai"
+
+# 需要重试的 HTTP 状态码：限流和服务端错误
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+# 当前线程最近一次请求建立新连接的耗时（复用连接时为 0）
+_timings = threading.local()
+
+
+class _TimedConnectionMixin:
+    """记录建立连接的耗时：_new_conn 包含 DNS 解析和 TCP 连接，connect 额外包含 TLS 握手"""
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        _timings.connect = time.perf_counter() - start
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _timings.tls = max(0.0, time.perf_counter() - start - getattr(_timings, "connect", 0.0))
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """使用可计时连接的连接池适配器"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class PollinationsClient:
+    """共享的 Pollinations.AI 客户端
+
+    持有一个带连接池的 requests.Session，多次请求复用 TCP/TLS 连接；
+    遇到 429/5xx 或连接错误（含连接超时）时按指数退避（带随机抖动）重试，并优先遵循服务端返回的 Retry-After。
+    读取超时不重试：一次生成最多阻塞 read_timeout 秒，而不是 (max_retries + 1) 倍。
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, pool_size=10, max_retries=3,
+                 backoff_factor=1.0, max_backoff=60.0, connect_timeout=10, read_timeout=300, limiter=None):
+        """
+        参数:
+            base_url (str): API 根地址
+            pool_size (int): 连接池大小（同一主机保持的最大连接数）
+            max_retries (int): 最大重试次数（不含首次请求）
+            backoff_factor (float): 退避基数（秒），第 n 次重试前等待约 backoff_factor * 2^n
+            max_backoff (float): 单次等待的上限（秒）
+            connect_timeout (float): 建立连接超时（秒）
+            read_timeout (float): 读取响应超时（秒）
+            limiter (AdaptiveRateLimiter, optional): 每次尝试前获取令牌，并根据响应调整速率
+        """
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.timeout = (connect_timeout, read_timeout)
+        self.limiter = limiter
+
+        self.session = requests.Session()
+        # 重试由本类自行处理，适配器本身不重试
+        adapter = _TimedHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _backoff_delay(self, attempt, response=None):
+        """计算第 attempt 次重试前的等待时间（秒）"""
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(retry_after, self.max_backoff)
+        delay = min(self.backoff_factor * (2 ** attempt), self.max_backoff)
+        # 全抖动，避免多个客户端同时重试
+        return random.uniform(0, delay)
+
+    def get(self, path, params=None, stream=False, stats=None, headers=None):
+        """发送 GET 请求，必要时重试
+
+        参数:
+            path (str): 相对于 base_url 的路径，例如 "/models"
+            params (dict, optional): 查询参数
+            stream (bool): 是否以流方式读取响应体
+            headers (dict, optional): 额外的请求头，例如条件请求的 If-None-Match
+            stats (dict, optional): 用于收集请求指标，会写入 retries、status、queued（等待限速的总时间），
+                以及最后一次尝试的 connect（DNS+TCP）、tls、ttfb 耗时（秒）；非流式请求还会写入最后一次尝试读取响应体的
+                download 耗时（不含之前失败的尝试和退避等待），流式请求的下载耗时由调用方在读取时自行计算
+
+        返回:
+            requests.Response: 状态码为 2xx（或条件请求的 304）的响应
+
+        异常:
+            requests.exceptions.RequestException: 重试用尽后仍然失败
+        """
+        url = f"{self.base_url}{path}"
+        if stats is None:
+            stats = {}
+        referrer = (params or {}).get("referrer", "")
+        attempt = 0
+        stats["queued"] = 0.0
+        while True:
+            response = None
+            _timings.connect = 0.0
+            _timings.tls = 0.0
+            stats["retries"] = attempt
+            stats.pop("download", None)
+            if self.limiter is not None:
+                stats["queued"] += self.limiter.acquire(referrer=referrer)
+            try:
+                sent = time.perf_counter()
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout, stream=stream)
+                stats["status"] = response.status_code
+                stats["connect"] = _timings.connect
+                stats["tls"] = _timings.tls
+                # requests 在读取响应头后计算 elapsed，即首字节时间
+                stats["ttfb"] = response.elapsed.total_seconds()
+                if not stream:
+                    # 非流式请求在 session.get 中已读完响应体，剩余时间即本次尝试的下载耗时
+                    stats["download"] = max(0.0, time.perf_counter() - sent - stats["ttfb"])
+                if self.limiter is not None:
+                    self.limiter.on_response(response.status_code, stats["ttfb"],
+                                             parse_retry_after(response.headers.get("Retry-After")))
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    if not response.ok:
+                        # 流式响应需要关闭，连接才会归还连接池
+                        response.close()
+                        response.raise_for_status()
+                    return response
+            except requests.exceptions.ReadTimeout as e:
+                stats["status"] = type(e).__name__
+                raise
+            except requests.exceptions.ConnectionError as e:
+                stats["status"] = type(e).__name__
+                if attempt >= self.max_retries:
+                    raise
+                logging.warning("请求失败，准备重试 (%d/%d): %s", attempt + 1, self.max_retries, e)
+            else:
+                logging.warning("服务端返回 %d，准备重试 (%d/%d)", response.status_code, attempt + 1, self.max_retries)
+                response.close()
+            # 带 Retry-After 的响应已由限速器统一暂停发放令牌，重试时在 acquire 中等待即可
+            if self.limiter is None or response is None or parse_retry_after(response.headers.get("Retry-After")) is None:
+                time.sleep(self._backoff_delay(attempt, response))
+            attempt += 1
+
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 头，支持秒数和 HTTP 日期两种格式，无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """返回进程内共享的客户端实例，首次调用时按 config.json 创建"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = load_config()
+                _client = PollinationsClient(
+                    base_url=config.get("api_base_url", DEFAULT_BASE_URL),
+                    pool_size=config.get("pool_size", 10),
+                    max_retries=config.get("max_retries", 3),
+                    backoff_factor=config.get("backoff_factor", 1.0),
+                    connect_timeout=config.get("connect_timeout", 10),
+                    read_timeout=config.get("read_timeout", 300),
+                    limiter=get_limiter(),
+                )
+    return _client
@@ -0,0 +1,155 @@
+# 后台任务执行器，将耗时调用移出 Tk 主线程
+import itertools
+import logging
+import queue
+import threading
+
+from ratelimit import PRIORITY_NORMAL, priority as request_priority
+
+
+class GenerationExecutor:
+    """后台生成执行器
+
+    任务提交到大小可配置的工作线程中执行，完成结果放入线程安全的队列，
+    由 Tk 主循环通过 root.after 定时轮询取出并调用回调函数，
+    因此回调函数中可以安全地操作界面组件。
+    等待中的任务按 (优先级, 提交顺序) 排队，界面中的单次生成会排在已提交的扫描任务之前开始。
+    工作线程是守护线程，关闭窗口后进程不会等待仍在进行的网络请求结束。
+    """
+
+    def __init__(self, root, max_workers=4, poll_interval=50, priority=None):
+        """
+        参数:
+            root (tk.Tk): 主窗口，用于 after 轮询
+            max_workers (int): 线程池大小，即同时进行的任务数
+            poll_interval (int): 结果队列轮询间隔（毫秒）
+            priority (int, optional): 任务的默认优先级（见 ratelimit），同时决定排队顺序和 API 请求的限速优先级
+        """
+        self.root = root
+        self.poll_interval = poll_interval
+        self.priority = priority
+        self._tasks = queue.PriorityQueue()  # (优先级, 任务编号, 任务)
+        self._results = queue.Queue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._jobs = {}  # job_id -> callback，取消的任务从中移除
+        self._closed = False
+        self._workers = []
+        for i in range(max(1, int(max_workers))):
+            worker = threading.Thread(target=self._work, name=f"generate_{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        self._after_id = self.root.after(self.poll_interval, self._poll)
+
+    def submit(self, func, *args, callback=None, priority=None, **kwargs):
+        """提交任务到工作线程
+
+        参数:
+            func (callable): 在后台线程中执行的函数
+            callback (callable, optional): 完成后在主线程中调用，参数为 func 的返回值；
+                func 抛出异常时参数为 (False, 错误消息)
+            priority (int, optional): 该任务的优先级（数值越小越先开始，也用于 API 请求的限速），默认使用执行器的优先级
+
+        返回:
+            int: 任务编号，可用于取消任务
+        """
+        job_id = next(self._ids)
+        priority = self.priority if priority is None else priority
+        with self._lock:
+            self._jobs[job_id] = callback
+        order = PRIORITY_NORMAL if priority is None else priority
+        self._tasks.put((order, job_id, (job_id, func, args, kwargs, priority)))
+        return job_id
+
+    def post(self, func, *args):
+        """从任意线程安排 func(*args) 在主线程中执行，例如更新进度显示"""
+        self._results.put((None, (func, args)))
+
+    def _work(self):
+        """工作线程主循环，取到 None 时退出"""
+        while True:
+            _, _, task = self._tasks.get()
+            if task is None:
+                return
+            job_id = task[0]
+            with self._lock:
+                if job_id not in self._jobs:
+                    # 开始前已被取消
+                    continue
+            self._run(*task)
+
+    def _run(self, job_id, func, args, kwargs, priority):
+        """在工作线程中执行任务，结果放入队列"""
+        try:
+            with request_priority(priority):
+                result = func(*args, **kwargs)
+        except Exception as e:
+            logging.error("后台任务 %d 执行失败: %s", job_id, e)
+            result = (False, f"错误: {str(e)}")
+        self._results.put((job_id, result))
+
+    def cancel(self, job_id):
+        """取消任务
+
+        尚未开始的任务不会再执行；已经开始的任务无法中断网络请求，
+        取消只是丢弃其结果，不再调用回调函数。
+
+        返回:
+            bool: 任务是否存在且被标记为取消
+        """
+        with self._lock:
+            if self._jobs.pop(job_id, None) is None:
+                return False
+        logging.info("已取消后台任务 %d", job_id)
+        return True
+
+    def cancel_all(self):
+        """取消所有未完成的任务，返回取消的任务数量"""
+        with self._lock:
+            job_ids = list(self._jobs)
+        return sum(1 for job_id in job_ids if self.cancel(job_id))
+
+    def pending_count(self):
+        """返回尚未完成（且未取消）的任务数量"""
+        with self._lock:
+            return len(self._jobs)
+
+    def _poll(self):
+        """在主线程中取出已完成的结果并调用回调函数"""
+        while True:
+            try:
+                job_id, result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if job_id is None:
+                func, args = result
+                try:
+                    func(*args)
+                except Exception as e:
+                    logging.error(f"主线程回调失败: {str(e)}")
+                continue
+            with self._lock:
+                callback = self._jobs.pop(job_id, None)
+            if callback is not None:
+                try:
+                    callback(result)
+                except Exception as e:
+                    logging.error(f"后台任务 {job_id} 回调失败: {str(e)}")
+        if not self._closed:
+            self._after_id = self.root.after(self.poll_interval, self._poll)
+
+    def shutdown(self):
+        """停止轮询并通知工作线程退出，未开始的任务将被取消
+
+        正在进行的任务不会被中断，但工作线程是守护线程，不会阻止进程退出，其结果被丢弃。
+        """
+        self._closed = True
+        try:
+            self.root.after_cancel(self._after_id)
+        except Exception:
+            pass
+        with self._lock:
+            self._jobs.clear()
+        for _ in self._workers:
+            # 排在所有任务之后，已取消的任务被跳过后工作线程退出
+            self._tasks.put((float("inf"), next(self._ids), None))
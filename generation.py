@@ -0,0 +1,167 @@
+# 生成请求：一次性验证参数，缓存编码后的提示词路径、查询参数和缓存键，供界面、命令行、批量任务和 API 共用
+import functools
+import urllib.parse
+
+from cache import make_cache_key
+
+# 宽度和高度的有效范围（像素）
+MIN_SIZE = 256
+MAX_SIZE = 4096
+
+# 构造参数的顺序，与 api.generate_image 的参数一致
+FIELDS = ("prompt", "width", "height", "seed", "referrer", "model", "nologo", "enhance", "private", "safe")
+
+
+@functools.lru_cache(maxsize=1024)
+def encode_prompt_path(prompt):
+    """返回提示词对应的请求路径 /prompt/<编码后的提示词>（相同提示词只编码一次）"""
+    return f"/prompt/{urllib.parse.quote(prompt)}"
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+def _to_int(name, value):
+    if isinstance(value, bool):
+        raise ValueError(f"{name}必须是整数")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name}必须是整数: {value!r}") from None
+
+
+class GenerationRequest:
+    """一次图像生成请求（不可修改）
+
+    构造时验证并规范化参数；请求路径、查询参数和缓存键在首次使用时计算并缓存。
+    批量展开同一提示词的大量种子或尺寸变体时，使用 replace() 只验证变化的字段，并复用已编码的提示词路径。
+    """
+
+    __slots__ = FIELDS + ("_path", "_params", "_key")
+
+    def __init__(self, prompt, width, height, seed, referrer="", model="flux", nologo=True, enhance=False, private=False, safe=True):
+        """
+        参数与 api.generate_image 相同
+
+        异常:
+            ValueError: 参数无效（提示词为空、宽高不在 256-4096 之间、种子不是整数等）
+        """
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise ValueError("提示词不能为空")
+        width = _to_int("宽度", width)
+        height = _to_int("高度", height)
+        if not (MIN_SIZE <= width <= MAX_SIZE and MIN_SIZE <= height <= MAX_SIZE):
+            raise ValueError(f"宽度和高度必须在 {MIN_SIZE}-{MAX_SIZE} 之间")
+        if not model:
+            raise ValueError("模型不能为空")
+        values = (prompt, width, height, _to_int("种子", seed), referrer or "", str(model),
+                  _to_bool(nologo), _to_bool(enhance), _to_bool(private), _to_bool(safe))
+        for name, value in zip(FIELDS, values):
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "_path", None)
+        object.__setattr__(self, "_params", None)
+        object.__setattr__(self, "_key", None)
+
+    @classmethod
+    def from_dict(cls, values):
+        """根据参数 dict 创建请求，忽略不属于生成参数的键"""
+        return cls(**{name: values[name] for name in FIELDS if name in values})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GenerationRequest 不可修改，请使用 replace() 创建新的请求")
+
+    def replace(self, **changes):
+        """返回修改了部分参数的新请求，只验证变化的字段，提示词不变时复用已编码的路径"""
+        unknown = set(changes) - set(FIELDS)
+        if unknown:
+            raise TypeError(f"未知参数: {', '.join(sorted(unknown))}")
+        values = {name: getattr(self, name) for name in FIELDS}
+        values.update(changes)
+        request = GenerationRequest.__new__(GenerationRequest)
+        for name in FIELDS:
+            object.__setattr__(request, name, values[name])
+        if "width" in changes or "height" in changes:
+            width, height = _to_int("宽度", request.width), _to_int("高度", request.height)
+            if not (MIN_SIZE <= width <= MAX_SIZE and MIN_SIZE <= height <= MAX_SIZE):
+                raise ValueError(f"宽度和高度必须在 {MIN_SIZE}-{MAX_SIZE} 之间")
+            object.__setattr__(request, "width", width)
+            object.__setattr__(request, "height", height)
+        if "seed" in changes:
+            object.__setattr__(request, "seed", _to_int("种子", request.seed))
+        if "prompt" in changes and (not isinstance(request.prompt, str) or not request.prompt.strip()):
+            raise ValueError("提示词不能为空")
+        if "model" in changes:
+            if not request.model:
+                raise ValueError("模型不能为空")
+            object.__setattr__(request, "model", str(request.model))
+        if "referrer" in changes:
+            object.__setattr__(request, "referrer", request.referrer or "")
+        for name in ("nologo", "enhance", "private", "safe"):
+            if name in changes:
+                object.__setattr__(request, name, _to_bool(changes[name]))
+        object.__setattr__(request, "_path", self._path if "prompt" not in changes else None)
+        object.__setattr__(request, "_params", None)
+        object.__setattr__(request, "_key", None)
+        return request
+
+    @property
+    def path(self):
+        """请求路径 /prompt/<编码后的提示词>"""
+        if self._path is None:
+            object.__setattr__(self, "_path", encode_prompt_path(self.prompt))
+        return self._path
+
+    @property
+    def params(self):
+        """查询参数 dict（布尔值为 "true"/"false"，referrer 为空时省略），调用方不应修改"""
+        if self._params is None:
+            params = {
+                "width": self.width,
+                "height": self.height,
+                "seed": self.seed,
+                "model": self.model,
+                "nologo": "true" if self.nologo else "false",
+                "enhance": "true" if self.enhance else "false",
+                "private": "true" if self.private else "false",
+                "safe": "true" if self.safe else "false",
+            }
+            if self.referrer:
+                params["referrer"] = self.referrer
+            object.__setattr__(self, "_params", params)
+        return self._params
+
+    @property
+    def key(self):
+        """稳定的规范化键，用于结果缓存和进行中请求合并"""
+        if self._key is None:
+            object.__setattr__(self, "_key", make_cache_key(self.prompt, self.params))
+        return self._key
+
+    def url(self, base_url):
+        """返回完整的请求 URL"""
+        return f"{base_url}{self.path}?{urllib.parse.urlencode(self.params)}"
+
+    def to_dict(self):
+        """返回 api.generate_image 的关键字参数"""
+        return {name: getattr(self, name) for name in FIELDS}
+
+    def __eq__(self, other):
+        if not isinstance(other, GenerationRequest):
+            return NotImplemented
+        return self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return (f"GenerationRequest(prompt={self.prompt!r}, width={self.width}, height={self.height}, "
+                f"seed={self.seed}, model={self.model!r})")
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        GenerationRequest.__init__(self, **state)
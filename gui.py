@@ -1,12 +1,18 @@
 # 用户界面实现，包含输入框、按钮和图像显示
 import tkinter as tk
 from tkinter import messagebox, filedialog, ttk
-from PIL import Image, ImageTk
-import io
 import logging
 import os
-from utils import load_config, save_image
+from utils import load_config, copy_image
+from executor import GenerationExecutor
+from generation import GenerationRequest
+from ratelimit import PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from metrics import get_metrics
+from models import get_catalogue
+from sweep import ThumbnailGrid, expand_sweep, parse_list, parse_seed_range, parse_sizes, sweep_label
+import functools
 import sys
+from datetime import datetime
 
 # 设置中文字体支持
 if sys.platform.startswith('win'):
@@ -16,7 +22,12 @@ else:
 
 class ImageGeneratorGUI:
     def __init__(self, root, generate_image_func):
-        """初始化图形界面"""
+        """初始化图形界面
+
+        参数:
+            generate_image_func (callable): 按 GenerationRequest 生成图像到文件的函数，
+                签名同 api.generate_request_to_file，返回 (成功标志, 保存路径或错误消息)
+        """
         self.root = root
         self.generate_image_func = generate_image_func
         self.config = load_config()
@@ -61,7 +72,8 @@ class ImageGeneratorGUI:
         # 模型选择
         ttk.Label(param_frame, text="模型选择:", anchor="w").grid(row=2, column=0, sticky="w", pady=5)
         self.model_var = tk.StringVar(value=self.config["default_model"])
-        models = self.config.get("available_models", ["flux", "gptimage", "kontext"])
+        # 使用缓存的模型列表立即填充，后台刷新完成后再更新
+        models = get_catalogue().models
         self.model_menu = ttk.Combobox(param_frame, textvariable=self.model_var, values=models, state="readonly", width=15)
         self.model_menu.grid(row=2, column=1, sticky="w", pady=5)
         
@@ -111,6 +123,25 @@ class ImageGeneratorGUI:
         self.safe_var = tk.BooleanVar(value=self.config["default_safe"])
         ttk.Checkbutton(option_frame, text="安全模式", variable=self.safe_var).pack(side="left", padx=10)
         
+        # 扫描选项（留空时使用上面的单个值）
+        ttk.Label(param_frame, text="批量扫描:", anchor="w").grid(row=6, column=0, sticky="w", pady=5)
+        
+        sweep_frame = ttk.Frame(param_frame)
+        sweep_frame.grid(row=6, column=1, columnspan=3, sticky="w")
+        
+        ttk.Label(sweep_frame, text="种子范围:").pack(side="left", padx=(0, 5))
+        self.sweep_seeds_entry = ttk.Entry(sweep_frame, width=12)
+        self.sweep_seeds_entry.insert(0, "1-16")
+        self.sweep_seeds_entry.pack(side="left", padx=(0, 15))
+        
+        ttk.Label(sweep_frame, text="尺寸:").pack(side="left", padx=(0, 5))
+        self.sweep_sizes_entry = ttk.Entry(sweep_frame, width=18)
+        self.sweep_sizes_entry.pack(side="left", padx=(0, 15))
+        
+        ttk.Label(sweep_frame, text="模型:").pack(side="left", padx=(0, 5))
+        self.sweep_models_entry = ttk.Entry(sweep_frame, width=15)
+        self.sweep_models_entry.pack(side="left")
+        
         # 按钮区域
         button_frame = ttk.Frame(self.main_frame)
         button_frame.pack(fill="x", pady=15)
@@ -124,6 +155,15 @@ class ImageGeneratorGUI:
         self.reset_button = ttk.Button(button_frame, text="重置参数", command=self.reset_parameters)
         self.reset_button.pack(side="left", padx=10)
         
+        self.cancel_button = ttk.Button(button_frame, text="取消生成", command=self.cancel_generation, state="disabled")
+        self.cancel_button.pack(side="left", padx=10)
+        
+        self.sweep_button = ttk.Button(button_frame, text="批量扫描", command=self.sweep)
+        self.sweep_button.pack(side="left", padx=10)
+        
+        self.history_button = ttk.Button(button_frame, text="历史记录", command=self.open_history)
+        self.history_button.pack(side="left", padx=10)
+        
         # 状态栏框架
         self.status_frame = ttk.Frame(self.main_frame)
         self.status_frame.pack(side="bottom", fill="x", pady=(10, 15), padx=10)
@@ -141,9 +181,10 @@ class ImageGeneratorGUI:
         image_frame.pack(fill="both", expand=True)
         image_frame.configure(height=400)  # 设置预览区域的最小高度
         
-        # 创建画布（无滚动条）
+        # 创建画布（扫描模式下显示滚动条）
         self.canvas = tk.Canvas(image_frame)
         self.canvas.pack(fill="both", expand=True)
+        self.scrollbar = ttk.Scrollbar(image_frame, orient="vertical")
         
         # 创建预览框架
         self.preview_frame = ttk.Frame(self.canvas)
@@ -164,108 +205,369 @@ class ImageGeneratorGUI:
         # 绑定窗口大小调整事件
         self.root.bind("<Configure>", self.on_resize)
         
-        self.current_image_data = None
+        self.current_image_path = None
+        self.current_params = None
         self.current_photo = None
-        
-        # 在所有组件加载完成后居中窗口
-        self.root.after(100, self.center_window)
+        self.preview_source = None  # 已解码的预览源图像（PreviewSource）
+        self.preview_size = None  # 当前显示的预览尺寸
+        self.load_token = 0  # 用于丢弃过期的解码结果
+        self.render_token = 0  # 用于丢弃过期的缩放结果
+        self.resize_after_id = None
+        
+        # 后台生成执行器，避免网络请求阻塞界面
+        self.executor = GenerationExecutor(self.root, max_workers=self.config.get("max_workers", 4), priority=PRIORITY_INTERACTIVE)
+        # 预览解码和缩放在单独的单线程执行器中串行进行
+        self.preview_executor = GenerationExecutor(self.root, max_workers=1)
+        self.load_job = None
+        self.render_job = None
+        # 扫描模式的缩略图网格，缩略图与预览共用解码执行器
+        self.thumbnail_grid = ThumbnailGrid(
+            self.canvas, self.scrollbar, self.preview_executor,
+            thumb_size=self.config.get("sweep_thumb_size", 160), on_select=self.on_sweep_select
+        )
+        # 历史记录窗口
+        self.history_window = None
+        self.history_rows = {}
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # 立即居中窗口，避免首帧显示后再跳动；模型列表在首帧绘制后再后台刷新
+        self.center_window()
+        self.root.after_idle(get_catalogue().refresh_in_background, functools.partial(self.executor.post, self.update_model_list))
     
+    def update_model_list(self, models):
+        """后台获取到新的模型列表后更新下拉菜单"""
+        self.model_menu.config(values=models)
+        logging.info(f"模型下拉菜单已更新: {models}")
+
     def on_resize(self, event):
-        """处理窗口大小调整，更新预览图像"""
-        if self.current_image_data:
+        """处理窗口大小调整，停止拖动一段时间后再更新预览图像或缩略图网格"""
+        if self.preview_source is None and not self.thumbnail_grid.active:
+            return
+        if self.resize_after_id is not None:
+            self.root.after_cancel(self.resize_after_id)
+        self.resize_after_id = self.root.after(self.config.get("resize_debounce_ms", 150), self.on_resize_done)
+
+    def on_resize_done(self):
+        """窗口大小稳定后重新排列缩略图或更新预览"""
+        self.resize_after_id = None
+        if self.thumbnail_grid.active:
+            self.thumbnail_grid.layout()
+        else:
             self.update_preview_image()
 
+    def load_preview(self, path):
+        """在后台解码新图像，完成后显示预览"""
+        self.load_token += 1
+        if self.load_job is not None:
+            self.preview_executor.cancel(self.load_job)
+        # Pillow 在第一次显示图像时才导入，缩短启动时间
+        from preview import load_preview
+        max_size = (self.root.winfo_screenwidth(), self.root.winfo_screenheight())
+        self.load_job = self.preview_executor.submit(
+            load_preview, path, max_size,
+            callback=functools.partial(self.on_preview_loaded, self.load_token)
+        )
+
+    def on_preview_loaded(self, token, outcome):
+        """预览源图像解码完成"""
+        if token != self.load_token:
+            return
+        success, result = outcome
+        if not success:
+            logging.error(f"更新预览图像失败: {result}")
+            self.status_label_left.config(text=result)
+            return
+        self.preview_source = result
+        self.preview_size = None
+        self.update_preview_image()
+
     def update_preview_image(self):
-        """动态更新预览图像大小"""
-        if not self.current_image_data:
+        """根据画布大小在后台生成预览图像"""
+        self.resize_after_id = None
+        if self.preview_source is None:
+            return
+        from preview import fit_size, render_preview
+        
+        # 获取画布可用空间（减去内边距）
+        canvas_width = self.canvas.winfo_width() - 20
+        canvas_height = self.canvas.winfo_height() - 40  # 额外减去文件名标签的高度
+        size = fit_size(*self.preview_source.original_size, max(canvas_width, 1), max(canvas_height, 1))
+        if size == self.preview_size:
             return
         
+        self.render_token += 1
+        if self.render_job is not None:
+            self.preview_executor.cancel(self.render_job)
+        self.render_job = self.preview_executor.submit(
+            render_preview, self.preview_source, canvas_width, canvas_height,
+            callback=functools.partial(self.on_preview_rendered, self.render_token, size)
+        )
+
+    def on_preview_rendered(self, token, size, outcome):
+        """在主线程中创建 PhotoImage 并替换预览"""
+        if token != self.render_token:
+            return
+        success, result = outcome
+        if not success:
+            logging.error(f"更新预览图像失败: {result}")
+            self.status_label_left.config(text=result)
+            return
+        from PIL import ImageTk
+        self.current_photo = ImageTk.PhotoImage(result)
+        self.image_label.config(image=self.current_photo, text="")
+        self.image_label.image = self.current_photo
+        self.preview_size = size
+
+    def read_parameters(self):
+        """读取并验证界面中的生成参数，返回 GenerationRequest，验证失败时提示错误并返回 None"""
         try:
-            img = Image.open(io.BytesIO(self.current_image_data))
-            original_width, original_height = img.size
-            
-            # 获取画布可用空间（减去内边距）
-            canvas_width = self.canvas.winfo_width() - 20
-            canvas_height = self.canvas.winfo_height() - 40  # 额外减去文件名标签的高度
-            
-            # 计算缩放比例，保持宽高比
-            ratio = min(canvas_width / original_width, canvas_height / original_height, 1.0)
-            preview_width = int(original_width * ratio)
-            preview_height = int(original_height * ratio)
-            
-            # 确保最小尺寸
-            if preview_width < 1:
-                preview_width = 1
-            if preview_height < 1:
-                preview_height = 1
-                
-            img = img.resize((preview_width, preview_height), Image.Resampling.LANCZOS)
-            self.current_photo = ImageTk.PhotoImage(img)
-            self.image_label.config(image=self.current_photo, text="")
-            self.image_label.image = self.current_photo
-            
-        except Exception as e:
-            logging.error(f"更新预览图像失败: {str(e)}")
-            self.status_label_left.config(text=f"显示图像失败: {str(e)}")
+            request = GenerationRequest(
+                self.prompt_entry.get(), self.width_entry.get(), self.height_entry.get(), self.seed_entry.get(),
+                referrer=self.referrer_entry.get(),
+                model=self.model_var.get(),
+                nologo=self.nologo_var.get(),
+                enhance=self.enhance_var.get(),
+                private=self.private_var.get(),
+                safe=self.safe_var.get(),
+            )
+        except ValueError as e:
+            messagebox.showerror("输入错误", str(e))
+            logging.error(f"输入验证失败: {str(e)}")
+            return None
+        
+        return request
 
     def generate(self):
         """处理图像生成逻辑"""
+        request = self.read_parameters()
+        if request is None:
+            return
+        
+        # 提交到后台执行，界面保持响应，可同时进行多个生成任务；已验证的请求直接传给 API，不再重复验证
+        self.executor.submit(
+            self.generate_image_func, request,
+            progress_callback=functools.partial(self.executor.post, self.on_download_progress),
+            callback=functools.partial(self.on_generate_done, request.to_dict()),
+        )
+        self.update_pending_status()
+    
+    def sweep(self):
+        """按种子范围、尺寸和模型列表并发生成，结果逐个显示在缩略图网格中"""
+        base = self.read_parameters()
+        if base is None:
+            return
         try:
-            width = int(self.width_entry.get())
-            height = int(self.height_entry.get())
-            seed = int(self.seed_entry.get())
-            if not (256 <= width <= 4096 and 256 <= height <= 4096):
-                raise ValueError("宽度和高度必须在 256-4096 之间")
+            seeds = parse_seed_range(self.sweep_seeds_entry.get())
+            sizes = parse_sizes(self.sweep_sizes_entry.get())
+            models = parse_list(self.sweep_models_entry.get())
+            # 先按范围计算组合数并检查上限，再展开并验证每个组合的尺寸和种子
+            jobs = expand_sweep(base, seeds, sizes, models, max_jobs=self.config.get("sweep_max_jobs", 256))
         except ValueError as e:
             messagebox.showerror("输入错误", str(e))
-            logging.error(f"输入验证失败: {str(e)}")
+            logging.error(f"扫描参数验证失败: {str(e)}")
             return
         
-        prompt = self.prompt_entry.get()
-        model = self.model_var.get()
-        
-        # 更新状态和按钮
-        self.status_label_left.config(text="正在生成图像，请稍候...")
-        self.generate_button.config(state="disabled")
-        self.save_button.config(state="disabled")
-        
-        self.root.update()
+        # 隐藏单图预览，在画布上显示缩略图网格
+        self.canvas.itemconfigure(self.canvas_frame, state="hidden")
+        self.thumbnail_grid.start(jobs, [sweep_label(request, base) for request in jobs])
+        token = self.thumbnail_grid.token
+        for index, request in enumerate(jobs):
+            self.executor.submit(
+                self.generate_image_func, request,
+                callback=functools.partial(self.on_sweep_result, token, index),
+                priority=PRIORITY_BATCH,
+            )
+        logging.info(f"开始扫描: {len(jobs)} 个组合")
+        self.status_label_left.config(text=f"扫描进度: 0/{len(jobs)}")
+        self.cancel_button.config(state="normal")
+    
+    def on_sweep_result(self, token, index, outcome):
+        """扫描中的一个组合完成"""
+        success, result = outcome
+        self.thumbnail_grid.set_result(token, index, success, result)
+        if token == self.thumbnail_grid.token and self.thumbnail_grid.active:
+            done, total = self.thumbnail_grid.progress()
+            self.status_label_left.config(text=f"扫描进度: {done}/{total}")
+            self.status_label_right.config(text=get_metrics().status_text())
+        if not self.executor.pending_count():
+            self.cancel_button.config(state="disabled")
+    
+    def on_sweep_select(self, request, path):
+        """点击缩略图：退出扫描模式，显示该图像并把其参数填回输入框"""
+        params = request.to_dict()
+        self.exit_sweep_mode()
+        self.apply_parameters(params)
+        self.show_image(path, params)
+    
+    def apply_parameters(self, params):
+        """把参数 dict 填回输入框（缺少的键保持不变）"""
+        for entry, key in ((self.prompt_entry, "prompt"), (self.width_entry, "width"), (self.height_entry, "height"),
+                           (self.seed_entry, "seed"), (self.referrer_entry, "referrer")):
+            if params.get(key) is not None:
+                entry.delete(0, tk.END)
+                entry.insert(0, str(params[key]))
+        if params.get("model"):
+            self.model_var.set(params["model"])
+        for var, key in ((self.nologo_var, "nologo"), (self.enhance_var, "enhance"),
+                         (self.private_var, "private"), (self.safe_var, "safe")):
+            if params.get(key) is not None:
+                var.set(bool(params[key]))
+    
+    def show_image(self, path, params):
+        """显示已保存的图像"""
+        self.current_image_path = path
+        self.current_params = params
+        self.current_filename = os.path.basename(path)
+        self.filename_label.config(text=self.current_filename)
+        self.save_button.config(state="normal")
+        self.load_preview(path)
+    
+    def open_history(self):
+        """打开历史记录窗口，后台从日志回填后显示最近的记录"""
+        if self.history_window is not None and self.history_window.winfo_exists():
+            self.history_window.lift()
+            return
+        from history import get_history
+        history = get_history()
+        if history is None:
+            messagebox.showinfo("历史记录", "历史记录未启用（config.json 中的 history_enabled）")
+            return
         
+        window = self.history_window = tk.Toplevel(self.root)
+        window.title("生成历史")
+        window.geometry("860x460")
+        frame = ttk.Frame(window, padding=10)
+        frame.pack(fill="both", expand=True)
+        
+        search_frame = ttk.Frame(frame)
+        search_frame.pack(fill="x", pady=(0, 10))
+        ttk.Label(search_frame, text="搜索提示词:").pack(side="left", padx=(0, 5))
+        self.history_query = ttk.Entry(search_frame, width=50)
+        self.history_query.pack(side="left", fill="x", expand=True)
+        self.history_query.bind("<Return>", lambda event: self.search_history())
+        ttk.Button(search_frame, text="搜索", command=self.search_history).pack(side="left", padx=5)
+        
+        columns = ("time", "prompt", "seed", "size", "model", "file")
+        headings = ("时间", "提示词", "种子", "尺寸", "模型", "文件")
+        widths = (130, 300, 70, 90, 80, 170)
+        tree_frame = ttk.Frame(frame)
+        tree_frame.pack(fill="both", expand=True)
+        self.history_tree = ttk.Treeview(tree_frame, columns=columns, show="headings", selectmode="browse")
+        for column, heading, width in zip(columns, headings, widths):
+            self.history_tree.heading(column, text=heading)
+            self.history_tree.column(column, width=width, anchor="w")
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.history_tree.yview)
+        self.history_tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side="right", fill="y")
+        self.history_tree.pack(side="left", fill="both", expand=True)
+        self.history_tree.bind("<Double-1>", lambda event: self.show_history_image())
+        
+        action_frame = ttk.Frame(frame)
+        action_frame.pack(fill="x", pady=(10, 0))
+        ttk.Button(action_frame, text="重新生成", command=self.regenerate_from_history).pack(side="left", padx=(0, 10))
+        ttk.Button(action_frame, text="查看图像", command=self.show_history_image).pack(side="left", padx=10)
+        ttk.Button(action_frame, text="填入参数", command=self.apply_history_parameters).pack(side="left", padx=10)
+        
+        self.executor.submit(
+            history.backfill, "logs",
+            callback=lambda outcome: self.search_history()
+        )
+    
+    def search_history(self):
+        """在后台搜索历史记录"""
+        if self.history_window is None or not self.history_window.winfo_exists():
+            return
+        from history import get_history
+        self.executor.submit(get_history().search, self.history_query.get(), 500, callback=self.on_history_results)
+    
+    def on_history_results(self, outcome):
+        """在历史记录窗口中显示搜索结果"""
+        success, rows = outcome
+        if self.history_window is None or not self.history_window.winfo_exists():
+            return
+        if not success:
+            messagebox.showerror("历史记录", rows, parent=self.history_window)
+            return
+        self.history_tree.delete(*self.history_tree.get_children())
+        self.history_rows = {}
+        for row in rows:
+            created = datetime.fromtimestamp(row["created"]).strftime("%Y-%m-%d %H:%M:%S")
+            status = os.path.basename(row["path"]) if row["path"] else ("失败" if row["success"] == 0 else "")
+            iid = self.history_tree.insert("", "end", values=(
+                created, row["prompt"], row["seed"], f"{row['width']}x{row['height']}", row["model"], status))
+            self.history_rows[iid] = row
+    
+    def apply_history_parameters(self):
+        """把选中记录的参数填回输入框，返回该记录（未选中时返回 None）"""
+        selection = self.history_tree.selection()
+        if not selection:
+            messagebox.showinfo("历史记录", "请先选择一条记录", parent=self.history_window)
+            return None
+        row = self.history_rows[selection[0]]
+        self.apply_parameters(row)
+        return row
+    
+    def regenerate_from_history(self):
+        """使用选中记录的参数重新生成"""
+        if self.apply_history_parameters() is not None:
+            self.generate()
+    
+    def show_history_image(self):
+        """显示选中记录对应的图像文件"""
+        row = self.apply_history_parameters()
+        if row is None:
+            return
+        if not row["path"] or not os.path.exists(row["path"]):
+            messagebox.showinfo("历史记录", "图像文件不存在，可点击\"重新生成\"", parent=self.history_window)
+            return
+        self.exit_sweep_mode()
+        self.show_image(row["path"], {key: row[key] for key in ("prompt", "width", "height", "seed", "referrer", "model",
+                                                                 "nologo", "enhance", "private", "safe")})
+    
+    def exit_sweep_mode(self):
+        """退出扫描模式，恢复单图预览"""
+        if self.thumbnail_grid.active:
+            self.thumbnail_grid.clear()
+            self.canvas.itemconfigure(self.canvas_frame, state="normal")
+            self.preview_size = None
+    
+    def update_pending_status(self):
+        """根据后台任务数量更新状态栏和取消按钮"""
+        pending = self.executor.pending_count()
+        if pending:
+            self.status_label_left.config(text=f"正在生成图像，请稍候... (进行中: {pending})")
+            self.cancel_button.config(state="normal")
+        else:
+            self.cancel_button.config(state="disabled")
+    
+    def on_download_progress(self, downloaded, total):
+        """在状态栏右侧显示下载进度"""
+        if total:
+            self.status_label_right.config(text=f"下载中: {downloaded / 1024:.0f}KB / {total / 1024:.0f}KB")
+        else:
+            self.status_label_right.config(text=f"下载中: {downloaded / 1024:.0f}KB")
+    
+    def on_generate_done(self, params, outcome):
+        """生成任务完成后在主线程中更新界面"""
+        success, result = outcome
+        width, height = params["width"], params["height"]
         try:
-            success, result = self.generate_image_func(
-                prompt, width, height, seed,
-                referrer=self.referrer_entry.get(),
-                model=model,
-                nologo=self.nologo_var.get(),
-                enhance=self.enhance_var.get(),
-                private=self.private_var.get(),
-                safe=self.safe_var.get()
-            )
             if success:
-                self.current_image_data = result
+                # 图像已流式写入 Images/ 目录，result 为保存路径
+                self.exit_sweep_mode()
+                self.current_image_path = result
+                self.current_params = params
+                self.current_filename = os.path.basename(result)
+                self.filename_label.config(text=f"{self.current_filename}")
+                logging.info(f"更新文件名标签: {self.current_filename}")
                 try:
-                    # 自动保存图像
-                    success_save, path = save_image(result)
-                    if success_save:
-                        self.current_filename = os.path.basename(path)
-                        self.filename_label.config(text=f"{self.current_filename}")
-                        logging.info(f"更新文件名标签: {self.current_filename}")
-                    else:
-                        self.current_filename = None
-                        self.filename_label.config(text="保存失败")
-                        logging.info("保存失败，更新文件名标签")
-                        logging.error(f"自动保存失败: {path}")
-                    
-                    # 更新预览图像
-                    self.update_preview_image()
+                    # 在后台解码并更新预览图像
+                    self.load_preview(result)
                     
                     # 获取图像文件大小
-                    file_size = len(result) / 1024  # 转换为KB
-                    if success_save:
-                        self.status_label_left.config(text=f"图像生成成功并已保存 ({width}x{height}, {file_size:.2f}KB)")
-                    else:
-                        self.status_label_left.config(text=f"图像生成成功 ({width}x{height}, {file_size:.2f}KB)，点击保存图像")
-                    self.status_label_right.config(text="")
+                    file_size = os.path.getsize(result) / 1024  # 转换为KB
+                    self.status_label_left.config(text=f"图像生成成功并已保存 ({width}x{height}, {file_size:.2f}KB)")
+                    self.status_label_right.config(text=get_metrics().status_text())
                     self.save_button.config(state="normal")
                 except Exception as e:
                     self.status_label_left.config(text=f"显示图像失败: {str(e)}")
@@ -274,37 +576,76 @@ class ImageGeneratorGUI:
             else:
                 error_msg = result if isinstance(result, str) else "未知错误，请稍后重试"
                 self.status_label_left.config(text=error_msg)
+                self.status_label_right.config(text=get_metrics().status_text())
                 messagebox.showerror("生成失败", error_msg)
         except Exception as e:
             self.status_label_left.config(text=f"生成失败: {str(e)}")
             logging.error(f"生成图像失败: {str(e)}")
         
-        self.generate_button.config(state="normal")
+        if self.executor.pending_count():
+            self.update_pending_status()
+        else:
+            self.cancel_button.config(state="disabled")
+    
+    def cancel_generation(self):
+        """取消所有进行中的生成任务（已发出的网络请求不会中断，只是丢弃其结果）"""
+        cancelled = self.executor.cancel_all()
+        self.cancel_button.config(state="disabled")
+        self.status_label_left.config(text=f"已取消 {cancelled} 个生成任务")
+    
+    def on_close(self):
+        """关闭窗口时停止后台执行器，进行中的请求在守护线程中被丢弃，不会阻止进程退出"""
+        self.executor.shutdown()
+        self.preview_executor.shutdown()
+        if "postprocess" in sys.modules:
+            sys.modules["postprocess"].shutdown_pool()
+        self.root.destroy()
     
     def save_image(self):
         """保存图像到用户指定路径"""
-        if not self.current_image_data:
+        if not self.current_image_path:
             messagebox.showerror("错误", "没有可保存的图像")
             return
         
         file_path = filedialog.asksaveasfilename(
             defaultextension=".jpg",
-            filetypes=[("JPEG files", "*.jpg"), ("PNG files", "*.png")]
+            filetypes=[("JPEG files", "*.jpg"), ("PNG files", "*.png"), ("WebP files", "*.webp")]
         )
-        if file_path:
-            success, result = save_image(self.current_image_data, file_path)
-            if success:
-                self.current_filename = os.path.basename(file_path)
-                self.filename_label.config(text=f"{self.current_filename}")
-                self.status_label_right.config(text=f"图像已保存为 {file_path}")
-            else:
-                self.status_label_right.config(text=f"图像保存失败: {result}")
+        if not file_path:
+            return
+        if os.path.splitext(file_path)[1].lower() in (".jpg", ".jpeg") and not self.config.get("export_metadata", True):
+            # 服务端返回的就是 JPEG，无需重新编码
+            self.on_save_done(file_path, copy_image(self.current_image_path, file_path))
+            return
+        # 转码和写入元数据在进程池中执行，不阻塞界面
+        from postprocess import export_image
+        params = self.current_params if self.config.get("export_metadata", True) else None
+        self.executor.submit(
+            export_image, self.current_image_path, file_path,
+            quality=self.config.get("export_quality", 90),
+            max_size=self.config.get("export_max_size"),
+            metadata=params,
+            callback=functools.partial(self.on_save_done, file_path)
+        )
+        self.status_label_right.config(text=f"正在保存 {os.path.basename(file_path)}...")
+    
+    def on_save_done(self, file_path, outcome):
+        """图像导出完成后更新状态栏"""
+        success, result = outcome
+        if success:
+            self.current_filename = os.path.basename(file_path)
+            self.filename_label.config(text=f"{self.current_filename}")
+            self.status_label_right.config(text=f"图像已保存为 {file_path}")
+        else:
+            self.status_label_right.config(text=f"图像保存失败: {result}")
     
     def center_window(self):
         """将窗口居中显示在屏幕上"""
-        self.root.update_idletasks()
+        # 窗口尚未显示时 winfo_width 为 1，此时使用设置的初始大小，无需等待布局完成
         width = self.root.winfo_width()
         height = self.root.winfo_height()
+        if width <= 1 or height <= 1:
+            width, height = 900, 700
         x = (self.root.winfo_screenwidth() // 2) - (width // 2)
         y = (self.root.winfo_screenheight() // 2) - (height // 2)
         self.root.geometry(f"{width}x{height}+{x}+{y}")
@@ -0,0 +1,389 @@
+# 生成历史索引：SQLite 记录每次生成的提示词、参数、输出文件、内容哈希、大小和耗时，支持提示词全文搜索和从日志增量回填
+import ast
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+
+from utils import current_log_file, load_config
+
+# 请求参数中保存为独立列的字段
+PARAM_FIELDS = ("width", "height", "seed", "model", "referrer", "nologo", "enhance", "private", "safe")
+
+COLUMNS = ("created", "prompt") + PARAM_FIELDS + ("path", "content_hash", "bytes", "latency", "success", "error", "source", "log_file", "log_line")
+
+# 来自日志的记录以 (log_file, log_line) 去重
+INSERT_SQL = f"INSERT OR IGNORE INTO generations ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    prompt TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    seed INTEGER,
+    model TEXT,
+    referrer TEXT,
+    nologo INTEGER,
+    enhance INTEGER,
+    private INTEGER,
+    safe INTEGER,
+    path TEXT,
+    content_hash TEXT,
+    bytes INTEGER,
+    latency REAL,
+    success INTEGER,
+    error TEXT,
+    source TEXT NOT NULL DEFAULT 'api',
+    log_file TEXT,
+    log_line INTEGER
+);
+CREATE INDEX IF NOT EXISTS generations_created ON generations (created);
+CREATE INDEX IF NOT EXISTS generations_path ON generations (path);
+CREATE INDEX IF NOT EXISTS generations_hash ON generations (content_hash);
+CREATE UNIQUE INDEX IF NOT EXISTS generations_log ON generations (log_file, log_line) WHERE log_file IS NOT NULL;
+CREATE TABLE IF NOT EXISTS log_files (
+    name TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS session_logs (
+    name TEXT PRIMARY KEY,
+    created REAL NOT NULL
+);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS generations_fts USING fts5(prompt, content='generations', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS generations_ai AFTER INSERT ON generations BEGIN
+    INSERT INTO generations_fts (rowid, prompt) VALUES (new.id, new.prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS generations_ad AFTER DELETE ON generations BEGIN
+    INSERT INTO generations_fts (generations_fts, rowid, prompt) VALUES ('delete', old.id, old.prompt);
+END;
+"""
+
+# 日志行格式: 2025-01-01 12:00:00,123 [INFO] 消息
+LOG_LINE = re.compile(r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),\d+ \[(\w+)\] (.*)$")
+# 日志文件名: app_20250101_120000.log，以及轮转后的 .log.1 或 .log.2025-01-01（第 1 组为轮转前的文件名）
+LOG_FILE_NAME = re.compile(r"^(.+\.log)(\.[\w-]+)?$")
+LOG_REQUEST = re.compile(r"^(发送 API 请求(?:（流式下载）)?|命中缓存): (\S+), 参数: (\{.*\})$")
+LOG_WRITTEN = re.compile(r"^图像生成成功并已写入: (.+) \((\d+) 字节\)$")
+LOG_SAVED = re.compile(r"^图像保存成功: (.+)$")
+LOG_FAILED = re.compile(r"^API 请求失败: (.*)$")
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.lower() == "true"
+    return bool(value)
+
+
+def _row_from_params(prompt, params):
+    row = dict.fromkeys(COLUMNS)
+    row["prompt"] = prompt
+    for field in PARAM_FIELDS:
+        value = params.get(field)
+        if field in ("nologo", "enhance", "private", "safe") and value is not None:
+            value = int(_to_bool(value))
+        row[field] = value
+    row["referrer"] = row["referrer"] or ""
+    return row
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """计算文件内容的 sha256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HistoryIndex:
+    """生成历史索引
+
+    record 只把记录放入队列，由后台线程按批写入数据库（一个事务写入多条），
+    不增加生成请求的耗时。查询前会先等待队列中的记录写入完成。
+    """
+
+    def __init__(self, db_path="cache/history.sqlite", batch_size=200):
+        """
+        参数:
+            db_path (str): 数据库文件路径
+            batch_size (int): 每个事务最多写入的记录数
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        try:
+            self._conn.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite 未编译 FTS5 时退化为 LIKE 搜索
+            logging.warning("SQLite 不支持 FTS5，历史搜索将使用 LIKE 匹配")
+            self.fts = False
+        self._conn.commit()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, prompt, params, path=None, content_hash=None, size=0, latency=None, success=True, error=None, data=None):
+        """记录一次生成调用（非阻塞）
+
+        参数:
+            prompt (str): 提示词
+            params (dict): 请求参数
+            path (str, optional): 输出文件路径
+            content_hash (str, optional): 图像内容 sha256，未提供时由后台线程根据 data 或 path 计算
+            size (int): 图像大小（字节）
+            latency (float, optional): 耗时（秒）
+            success (bool): 是否成功
+            error (str, optional): 错误消息
+            data (bytes, optional): 图像数据，仅用于计算内容哈希
+        """
+        row = _row_from_params(prompt, params)
+        row.update(created=time.time(), path=path, content_hash=content_hash, bytes=size,
+                   latency=latency, success=int(success), error=error, source="api")
+        self._queue.put((row, data))
+
+    def _write_loop(self):
+        while True:
+            items = [self._queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = []
+            for row, data in items:
+                if row["success"] and row["content_hash"] is None:
+                    try:
+                        if data is not None:
+                            row["content_hash"] = hashlib.sha256(data).hexdigest()
+                        elif row["path"]:
+                            row["content_hash"] = file_hash(row["path"])
+                    except OSError:
+                        pass
+                rows.append(row)
+            try:
+                if rows:
+                    self._insert(rows)
+            except sqlite3.Error as e:
+                logging.error(f"历史记录写入失败: {str(e)}")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def _insert(self, rows):
+        with self._lock:
+            self._conn.executemany(INSERT_SQL, [tuple(row[column] for column in COLUMNS) for row in rows])
+            self._conn.commit()
+
+    def flush(self):
+        """等待队列中的记录全部写入"""
+        self._queue.join()
+
+    def search(self, query="", limit=100):
+        """按提示词搜索历史记录（空查询返回最近的记录），返回 dict 列表，最新的在前"""
+        self.flush()
+        query = query.strip()
+        with self._lock:
+            if not query:
+                cursor = self._conn.execute("SELECT * FROM generations ORDER BY created DESC LIMIT ?", (limit,))
+            elif self.fts:
+                # 每个词作为前缀匹配，词之间为 AND 关系
+                terms = " ".join('"' + term.replace('"', '""') + '"*' for term in query.split())
+                cursor = self._conn.execute(
+                    "SELECT g.* FROM generations_fts JOIN generations g ON g.id = generations_fts.rowid "
+                    "WHERE generations_fts MATCH ? ORDER BY g.created DESC LIMIT ?", (terms, limit))
+            else:
+                cursor = self._conn.execute(
+                    "SELECT * FROM generations WHERE prompt LIKE ? ORDER BY created DESC LIMIT ?", (f"%{query}%", limit))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def find_by_path(self, path):
+        """返回生成该文件的最近一条记录，找不到时返回 None"""
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM generations WHERE path = ? ORDER BY created DESC LIMIT 1", (path,)).fetchone()
+        return dict(row) if row else None
+
+    def count(self):
+        """返回记录总数"""
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+
+    def add_session_log(self, log_file):
+        """登记使用本索引的进程所写的日志文件
+
+        这些进程中的调用已由 record 直接记录，回填时跳过该日志文件及其轮转文件，避免重复记录。
+        """
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO session_logs (name, created) VALUES (?, ?)",
+                               (os.path.basename(log_file), time.time()))
+            self._conn.commit()
+
+    def backfill(self, log_dir="logs"):
+        """从日志文件中增量回填历史记录
+
+        只回填没有直接写入本索引的进程所写的日志（例如启用历史记录之前的日志），
+        已通过 add_session_log 登记的日志及其轮转文件会被跳过。
+        每个日志文件记录已处理到的字节偏移，之后只解析新增的完整行。
+
+        参数:
+            log_dir (str): 日志目录
+
+        返回:
+            int: 新增的记录数
+        """
+        if not os.path.isdir(log_dir):
+            return 0
+        with self._lock:
+            offsets = {row["name"]: row["offset"] for row in self._conn.execute("SELECT name, offset FROM log_files")}
+            sessions = {row["name"] for row in self._conn.execute("SELECT name FROM session_logs")}
+        added = 0
+        for entry in sorted(os.scandir(log_dir), key=lambda entry: entry.name):
+            match = LOG_FILE_NAME.match(entry.name)
+            if not entry.is_file() or not match or match.group(1) in sessions:
+                continue
+            stat = entry.stat()
+            offset = offsets.get(entry.name, 0)
+            if offset > stat.st_size:
+                # 文件被截断或替换，重新解析
+                offset = 0
+            if offset == stat.st_size:
+                continue
+            rows, offset = _parse_log(entry.path, entry.name, offset)
+            with self._lock:
+                cursor = self._conn.executemany(INSERT_SQL, [tuple(row[column] for column in COLUMNS) for row in rows])
+                added += max(cursor.rowcount, 0)
+                self._conn.execute("INSERT OR REPLACE INTO log_files (name, offset, mtime) VALUES (?, ?, ?)",
+                                   (entry.name, offset, stat.st_mtime))
+                self._conn.commit()
+        if added:
+            logging.info(f"从日志回填历史记录: {added} 条")
+        return added
+
+    def close(self):
+        """写入剩余记录并关闭数据库"""
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+def _parse_log_line(line):
+    """解析一行文本或 JSON Lines 格式的日志，返回 (时间戳, 消息)，无法解析时返回 None"""
+    if line.startswith("{"):
+        try:
+            entry = json.loads(line)
+            timestamp, message = entry["time"], entry["message"]
+        except (ValueError, KeyError, TypeError):
+            return None
+    else:
+        match = LOG_LINE.match(line)
+        if not match:
+            return None
+        timestamp, message = match.group(1), match.group(3)
+    try:
+        return datetime.strptime(timestamp[:19], "%Y-%m-%d %H:%M:%S").timestamp(), message
+    except ValueError:
+        return None
+
+
+def _parse_log(path, name, offset):
+    """解析日志文件中 offset 之后的完整行，返回 (记录列表, 新的偏移)
+
+    每条记录以请求行在文件中的字节偏移作为 log_line，重复回填时不会产生重复记录。
+    并发生成时请求与结果行可能交错，按先进先出的顺序配对；耗时按日志时间估算（精度 1 秒）。
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    rows = []
+    pending = []  # 已发送、尚未得到结果的请求
+    unsaved = []  # 已成功、等待 "图像保存成功" 行的请求（generate_image + save_image）
+    position = offset
+    for raw in data[:end].splitlines(keepends=True):
+        line_offset = position
+        position += len(raw)
+        parsed = _parse_log_line(raw.decode("utf-8", errors="replace").rstrip("\r\n"))
+        if parsed is None:
+            continue
+        created, message = parsed
+        request = LOG_REQUEST.match(message)
+        if request:
+            try:
+                params = ast.literal_eval(request.group(3))
+            except (ValueError, SyntaxError):
+                continue
+            prompt = urllib.parse.unquote(request.group(2).split("/prompt/", 1)[-1])
+            row = _row_from_params(prompt, params)
+            row.update(created=created, source="log", log_file=name, log_line=line_offset)
+            rows.append(row)
+            if request.group(1) == "命中缓存":
+                row.update(success=1, latency=0.0)
+            else:
+                pending.append(row)
+            continue
+        written = LOG_WRITTEN.match(message)
+        saved = LOG_SAVED.match(message)
+        failed = LOG_FAILED.match(message)
+        if message == "图像生成成功" and pending:
+            row = pending.pop(0)
+            row.update(success=1, latency=created - row["created"])
+            unsaved.append(row)
+        elif written and pending:
+            row = pending.pop(0)
+            row.update(success=1, latency=created - row["created"], path=written.group(1), bytes=int(written.group(2)))
+        elif saved and unsaved:
+            unsaved.pop(0)["path"] = saved.group(1)
+        elif failed and pending:
+            row = pending.pop(0)
+            row.update(success=0, latency=created - row["created"], error=failed.group(1))
+    return rows, end + offset
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history():
+    """返回进程内共享的历史索引，config.json 中 history_enabled 为 false 时返回 None"""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                config = load_config()
+                if config.get("history_enabled", True):
+                    try:
+                        _history = HistoryIndex(os.path.join(config.get("cache_dir", "cache"), "history.sqlite"))
+                        atexit.register(_history.flush)
+                        # 本进程的调用由 api 直接记录，其日志之后不再回填
+                        log_file = current_log_file()
+                        if log_file:
+                            _history.add_session_log(log_file)
+                    except sqlite3.Error as e:
+                        logging.error(f"历史索引打开失败: {str(e)}")
+                        _history = False
+                else:
+                    _history = False
+    return _history or None
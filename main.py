@@ -1,10 +1,36 @@
 # 程序入口，初始化 GUI 和事件处理
-import tkinter as tk
 import os
-from gui import ImageGeneratorGUI
-from api import generate_image
+import sys
+from utils import StartupProfiler, setup_logging
+
+def generate_request_to_file(request, **kwargs):
+    """首次生成图像时才导入 api（requests 等网络模块），不占用启动时间；参数同 api.generate_request_to_file"""
+    from api import generate_request_to_file as generate
+    return generate(request, **kwargs)
 
 def main():
+    argv = sys.argv[1:]
+    # --profile-startup: 输出各启动阶段和模块导入的耗时
+    profiler = None
+    if "--profile-startup" in argv:
+        argv.remove("--profile-startup")
+        profiler = StartupProfiler()
+        profiler.install()
+    
+    setup_logging()
+    if profiler:
+        profiler.mark("初始化日志")
+    
+    # 带有子命令时以命令行模式运行（例如 python main.py batch jobs.jsonl），无需图形界面
+    if argv:
+        from cli import main as cli_main
+        sys.exit(cli_main(argv))
+    
+    import tkinter as tk
+    from gui import ImageGeneratorGUI
+    if profiler:
+        profiler.mark("导入界面模块")
+    
     # 创建Images目录
     os.makedirs("Images", exist_ok=True)
     # 创建主窗口
@@ -13,8 +39,20 @@ def main():
     root.title("Pollinations.AI 图像生成器")
     # 设置窗口最小大小
     root.minsize(600, 500)
+    if profiler:
+        profiler.mark("创建主窗口")
     # 初始化 GUI，传入主窗口和 API 调用函数
-    app = ImageGeneratorGUI(root, generate_image)
+    app = ImageGeneratorGUI(root, generate_request_to_file)
+    if profiler:
+        profiler.mark("构建界面")
+        
+        def first_frame():
+            root.update_idletasks()
+            profiler.mark("首帧")
+            profiler.uninstall()
+            print(profiler.report())
+        
+        root.after_idle(first_frame)
     # 启动主事件循环
     root.mainloop()
 
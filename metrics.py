@@ -0,0 +1,172 @@
+# 生成请求的延迟与吞吐量指标：进程内直方图注册表，可导出为 Prometheus 文本或 JSON
+import json
+import threading
+import time
+from collections import deque
+
+# Prometheus 直方图的桶边界（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+# 每个请求记录的耗时阶段（秒）
+PHASES = ("queued", "connect", "tls", "ttfb", "download", "total")
+
+
+class Histogram:
+    """累计分桶计数，并保留最近的样本用于计算分位数"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, max_samples=2048):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=max_samples)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def percentile(self, q):
+        """按最近样本计算分位数（q 为 0-100），无样本时返回 None"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+        return round(ordered[index], 6)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class MetricsRegistry:
+    """请求指标注册表（线程安全）
+
+    每条记录是一个 dict，包含 model、width、height、status、bytes、retries、cache_hit
+    以及 PHASES 中各阶段的耗时。总耗时按模型和分辨率分别统计分位数。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.by_model = {}
+        self.by_resolution = {}
+        self.status_counts = {}
+        self.requests = 0
+        self.bytes = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.errors = 0
+
+    def observe(self, record):
+        """记录一次生成请求"""
+        with self._lock:
+            self.requests += 1
+            self.bytes += record.get("bytes", 0)
+            self.retries += record.get("retries", 0)
+            if record.get("cache_hit"):
+                self.cache_hits += 1
+            if not record.get("success", True):
+                self.errors += 1
+            status = str(record.get("status", "none"))
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            for phase in PHASES:
+                if record.get(phase) is not None:
+                    self.phases[phase].observe(record[phase])
+            total = record.get("total")
+            if total is not None:
+                model = record.get("model", "unknown")
+                resolution = f"{record.get('width')}x{record.get('height')}"
+                self.by_model.setdefault(model, Histogram()).observe(total)
+                self.by_resolution.setdefault(resolution, Histogram()).observe(total)
+
+    def snapshot(self):
+        """返回可序列化为 JSON 的指标快照"""
+        with self._lock:
+            elapsed = max(time.time() - self.started, 1e-9)
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "bytes": self.bytes,
+                "retries": self.retries,
+                "cache_hits": self.cache_hits,
+                "throughput_rps": round(self.requests / elapsed, 4),
+                "status": dict(self.status_counts),
+                "phases": {phase: hist.summary() for phase, hist in self.phases.items()},
+                "by_model": {model: hist.summary() for model, hist in self.by_model.items()},
+                "by_resolution": {res: hist.summary() for res, hist in self.by_resolution.items()},
+            }
+
+    def write_snapshot(self, path):
+        """将 JSON 快照写入文件"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            lines.append("# TYPE pollinations_requests_total counter")
+            for status, count in sorted(self.status_counts.items()):
+                lines.append(f'pollinations_requests_total{{status="{status}"}} {count}')
+            lines.append("# TYPE pollinations_bytes_total counter")
+            lines.append(f"pollinations_bytes_total {self.bytes}")
+            lines.append("# TYPE pollinations_retries_total counter")
+            lines.append(f"pollinations_retries_total {self.retries}")
+            lines.append("# TYPE pollinations_cache_hits_total counter")
+            lines.append(f"pollinations_cache_hits_total {self.cache_hits}")
+            lines.append("# TYPE pollinations_phase_seconds histogram")
+            for phase, hist in self.phases.items():
+                lines.extend(_histogram_lines("pollinations_phase_seconds", f'phase="{phase}"', hist))
+            lines.append("# TYPE pollinations_request_seconds histogram")
+            for model, hist in sorted(self.by_model.items()):
+                lines.extend(_histogram_lines("pollinations_request_seconds", f'model="{_escape(model)}"', hist))
+            for res, hist in sorted(self.by_resolution.items()):
+                lines.extend(_histogram_lines("pollinations_request_seconds", f'resolution="{res}"', hist))
+        return "\n".join(lines) + "\n"
+
+    def status_text(self):
+        """适合显示在状态栏中的简短摘要"""
+        total = self.phases["total"]
+        with self._lock:
+            if not total.count:
+                return ""
+            p50 = total.percentile(50)
+            p95 = total.percentile(95)
+            return (f"请求 {self.requests} | p50 {p50:.2f}s | p95 {p95:.2f}s | "
+                    f"TTFB p50 {self.phases['ttfb'].percentile(50) or 0:.2f}s | 缓存命中 {self.cache_hits}")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _histogram_lines(name, labels, hist):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(hist.buckets, hist.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+    lines.append(f"{name}_sum{{{labels}}} {hist.sum:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {hist.count}")
+    return lines
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    """返回进程内共享的指标注册表"""
+    return _registry
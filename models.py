@@ -0,0 +1,152 @@
+# 模型目录：内存和磁盘缓存可用模型列表，过期后通过 ETag/If-Modified-Since 条件请求重新验证
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from utils import load_config
+
+DEFAULT_MODELS = ["flux", "gptimage", "kontext"]
+
+
+class ModelCatalogue:
+    """可用模型列表
+
+    启动时直接使用缓存文件中的列表（没有缓存时使用 config.json 中的 available_models），
+    不等待网络；超过 ttl 后在后台发送条件请求，服务端返回 304 时只更新检查时间。
+    """
+
+    def __init__(self, cache_path="cache/models.json", ttl=24 * 3600, fallback=None):
+        """
+        参数:
+            cache_path (str): 磁盘缓存文件路径
+            ttl (float): 缓存有效期（秒）
+            fallback (list, optional): 没有任何缓存时使用的模型列表
+        """
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._state = {"models": list(fallback or DEFAULT_MODELS), "checked_at": 0, "etag": None, "last_modified": None}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.error(f"模型缓存读取失败: {str(e)}")
+            return
+        if isinstance(state.get("models"), list) and state["models"]:
+            self._state.update(state)
+
+    def _save(self):
+        directory = os.path.dirname(self.cache_path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logging.error(f"模型缓存写入失败: {str(e)}")
+
+    @property
+    def models(self):
+        """当前已知的模型列表（不会发起网络请求）"""
+        with self._lock:
+            return list(self._state["models"])
+
+    def is_fresh(self):
+        """缓存是否仍在有效期内"""
+        with self._lock:
+            return time.time() - self._state["checked_at"] < self.ttl
+
+    def refresh(self, force=False):
+        """向服务端重新验证模型列表
+
+        参数:
+            force (bool): 为 True 时忽略有效期，且不发送条件请求头
+
+        返回:
+            tuple: (成功标志, 模型列表是否发生变化)
+        """
+        if not force and self.is_fresh():
+            return True, False
+        with self._lock:
+            headers = {}
+            if not force:
+                if self._state.get("etag"):
+                    headers["If-None-Match"] = self._state["etag"]
+                if self._state.get("last_modified"):
+                    headers["If-Modified-Since"] = self._state["last_modified"]
+        # 网络相关模块在首次刷新时才导入，界面启动时只需读取缓存
+        import requests
+        from client import get_client
+
+        try:
+            response = get_client().get("/models", headers=headers)
+            if response.status_code == 304:
+                logging.info("模型列表未变化 (304)")
+                with self._lock:
+                    self._state["checked_at"] = time.time()
+                    self._save()
+                return True, False
+            models = response.json()
+            if not isinstance(models, list) or not models:
+                raise ValueError("模型列表格式无效")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.error(f"获取模型列表失败: {str(e)}")
+            return False, False
+        with self._lock:
+            changed = models != self._state["models"]
+            self._state.update(
+                models=models,
+                checked_at=time.time(),
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+            self._save()
+        logging.info(f"模型列表已更新: {models}")
+        return True, changed
+
+    def refresh_in_background(self, callback=None):
+        """缓存过期时在后台线程中刷新，列表变化后调用 callback(models)（在后台线程中调用）"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                success, changed = self.refresh()
+                if success and changed and callback is not None:
+                    callback(self.models)
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name="model-catalogue", daemon=True).start()
+
+
+_catalogue = None
+_catalogue_lock = threading.Lock()
+
+
+def get_catalogue():
+    """返回进程内共享的模型目录，首次调用时按 config.json 创建"""
+    global _catalogue
+    if _catalogue is None:
+        with _catalogue_lock:
+            if _catalogue is None:
+                config = load_config()
+                _catalogue = ModelCatalogue(
+                    cache_path=os.path.join(config.get("cache_dir", "cache"), "models.json"),
+                    ttl=config.get("models_ttl", 24 * 3600),
+                    fallback=config.get("available_models", DEFAULT_MODELS),
+                )
+    return _catalogue
@@ -0,0 +1,199 @@
+# 后处理：格式转换（JPEG/PNG/WebP）、缩小尺寸、生成缩略图和写入生成参数元数据，在进程池中批量执行
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+# 扩展名 -> Pillow 格式名
+FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".webp": "WEBP"}
+
+# EXIF ImageDescription 标签，JPEG/WebP 中以 JSON 保存生成参数
+EXIF_IMAGE_DESCRIPTION = 0x010E
+EXIF_SOFTWARE = 0x0131
+SOFTWARE = "Pollinations.AI Image Generator"
+
+
+def make_job(src, dest, quality=90, max_size=None, thumbnail=None, metadata=None):
+    """构建一个后处理任务（普通 dict，便于传给子进程）
+
+    参数:
+        src (str): 源图像路径
+        dest (str): 输出路径，格式由扩展名决定（.jpg/.jpeg/.png/.webp）
+        quality (int): JPEG/WebP 质量（1-100）
+        max_size (int, optional): 输出图像最长边的上限，超过时等比缩小
+        thumbnail (int, optional): 缩略图最长边，给定时额外输出 <文件名>_<扩展名>_thumb.jpg
+        metadata (dict, optional): 写入图像的生成参数
+    """
+    return {"src": src, "dest": dest, "quality": quality, "max_size": max_size,
+            "thumbnail": thumbnail, "metadata": metadata}
+
+
+def thumbnail_path(dest):
+    """返回缩略图路径，包含输出格式，同一源图像导出为多种格式时缩略图互不覆盖"""
+    stem, ext = os.path.splitext(dest)
+    return f"{stem}_{ext.lstrip('.').lower()}_thumb.jpg"
+
+
+def _part_path(path):
+    """在 path 所在目录中创建唯一的空临时文件并返回其路径，并发导出到同一目标时互不覆盖
+
+    与 api._open_part_file 一样使用 0o666 并遵循 umask，重命名后的图像权限与直接保存的相同。
+    """
+    while True:
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.part"
+        try:
+            os.close(os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))
+            return tmp_path
+        except FileExistsError:
+            continue
+
+
+def _encode_options(image, fmt, quality, metadata):
+    """返回 Image.save 的参数，包含格式相关的元数据"""
+    from PIL import Image, PngImagePlugin
+
+    options = {"format": fmt}
+    if fmt == "PNG":
+        options["optimize"] = True
+        if metadata:
+            info = PngImagePlugin.PngInfo()
+            info.add_text("Software", SOFTWARE)
+            info.add_itxt("parameters", json.dumps(metadata, ensure_ascii=False))
+            for key, value in metadata.items():
+                info.add_itxt(key, str(value))
+            options["pnginfo"] = info
+        return options
+    options["quality"] = quality
+    if fmt == "JPEG":
+        options["optimize"] = True
+        options["progressive"] = True
+    else:
+        options["method"] = 4
+    if metadata:
+        exif = Image.Exif()
+        exif[EXIF_SOFTWARE] = SOFTWARE
+        # EXIF 字符串只能是 ASCII，非 ASCII 字符以 JSON 转义形式保存
+        exif[EXIF_IMAGE_DESCRIPTION] = json.dumps(metadata)
+        options["exif"] = exif.tobytes()
+    return options
+
+
+def _prepare(image, fmt):
+    """转换为目标格式支持的颜色模式（JPEG 不支持透明通道）"""
+    if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+        return image.convert("RGB")
+    if image.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+        return image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    return image
+
+
+def process_image(job):
+    """执行一个后处理任务（在子进程中运行，也可直接调用）
+
+    数据先写入目标目录中的临时文件，完成后原子地重命名为目标文件。
+
+    返回:
+        tuple: (成功标志, 输出路径或错误消息)
+    """
+    from PIL import Image
+
+    dest = job["dest"]
+    fmt = FORMATS.get(os.path.splitext(dest)[1].lower())
+    if fmt is None:
+        return False, f"不支持的图像格式: {dest}"
+    tmp_path = _part_path(dest)
+    thumb_tmp = None
+    try:
+        with Image.open(job["src"]) as img:
+            max_size = job.get("max_size")
+            if max_size and max(img.size) > max_size:
+                # JPEG 先用 draft 模式按接近目标尺寸解码，再精确缩小
+                img.draft("RGB", (max_size, max_size))
+                img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+            else:
+                img.load()
+            image = _prepare(img, fmt)
+            image.save(tmp_path, **_encode_options(image, fmt, job.get("quality", 90), job.get("metadata")))
+            os.replace(tmp_path, dest)
+            size = job.get("thumbnail")
+            if size:
+                thumb = image.convert("RGB") if image.mode != "RGB" else image.copy()
+                thumb.thumbnail((size, size), Image.Resampling.LANCZOS)
+                thumb_dest = thumbnail_path(dest)
+                thumb_tmp = _part_path(thumb_dest)
+                thumb.save(thumb_tmp, format="JPEG", quality=85)
+                os.replace(thumb_tmp, thumb_dest)
+        return True, dest
+    except Exception as e:
+        for path in (tmp_path, thumb_tmp):
+            if path and os.path.exists(path):
+                os.remove(path)
+        return False, f"图像处理失败: {str(e)}"
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(max_workers=None):
+    """返回进程内共享的后处理进程池，首次调用时创建（默认按 CPU 核数）
+
+    调用方通常是多线程进程（界面、日志监听、历史写入线程），从中 fork 子进程可能继承被其他线程持有的锁而死锁，
+    因此子进程总是以 spawn 方式启动。
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    """关闭共享进程池"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def process_batch(jobs, max_workers=None):
+    """在进程池中并行执行一批后处理任务，阻塞直到全部完成
+
+    参数:
+        jobs (list): make_job 构建的任务列表
+        max_workers (int, optional): 进程数，默认按 CPU 核数
+
+    返回:
+        list: 与 jobs 顺序一致的 (成功标志, 输出路径或错误消息) 列表
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    # 每个子进程一次领取多个任务，减少进程间通信次数
+    chunksize = max(1, len(jobs) // ((max_workers or os.cpu_count() or 1) * 4))
+    results = list(get_pool(max_workers).map(process_image, jobs, chunksize=chunksize))
+    for job, (success, result) in zip(jobs, results):
+        if success:
+            logging.info("图像导出成功: %s", result)
+        else:
+            logging.error("图像导出失败 %s: %s", job["src"], result)
+    return results
+
+
+def export_image(src, dest, **options):
+    """在进程池中转换并导出单个图像（阻塞直到完成，应在后台线程中调用）
+
+    参数:
+        src (str): 源图像路径
+        dest (str): 输出路径
+        **options: make_job 的其他参数
+
+    返回:
+        tuple: (成功标志, 输出路径或错误消息)
+    """
+    return process_batch([make_job(src, dest, **options)])[0]
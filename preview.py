@@ -0,0 +1,89 @@
+# 预览图像处理：解码一次并缓存，按需从缩小版本金字塔中生成预览尺寸
+from PIL import Image
+
+# 金字塔最小层级的边长，小于此尺寸不再继续缩小
+MIN_LEVEL_SIZE = 128
+
+
+def fit_size(original_width, original_height, box_width, box_height):
+    """计算保持宽高比、放入指定区域且不放大的预览尺寸（最小 1x1）"""
+    ratio = min(box_width / original_width, box_height / original_height, 1.0)
+    return max(1, int(original_width * ratio)), max(1, int(original_height * ratio))
+
+
+class PreviewSource:
+    """已解码的预览源图像
+
+    解码时对 JPEG 使用 draft 模式直接按接近屏幕的分辨率解码，
+    并预先生成逐级减半的缩小版本（mip 金字塔）。生成预览时选择不小于目标尺寸的最小层级再缩放，
+    窗口大小变化时无需重新解码原图，也不必每次从全分辨率图像做 LANCZOS 缩放。
+    """
+
+    def __init__(self, path, max_size=None):
+        """
+        参数:
+            path (str): 图像文件路径
+            max_size (tuple, optional): (宽, 高)，预览可能用到的最大尺寸，通常为屏幕大小
+        """
+        with Image.open(path) as img:
+            self.original_size = img.size
+            if max_size:
+                # 仅对 JPEG 生效：以 1/2、1/4、1/8 比例解码，且结果不小于 max_size
+                img.draft("RGB", max_size)
+            img.load()
+            base = img.convert("RGB") if img.mode not in ("RGB", "RGBA") else img.copy()
+        self.levels = [base]
+        while min(self.levels[-1].size) >= MIN_LEVEL_SIZE * 2:
+            self.levels.append(self.levels[-1].reduce(2))
+
+    def render(self, box_width, box_height):
+        """生成适合 box_width x box_height 区域的预览图像"""
+        target = fit_size(*self.original_size, box_width, box_height)
+        source = self.levels[0]
+        for level in self.levels:
+            if level.size[0] >= target[0] and level.size[1] >= target[1]:
+                source = level
+            else:
+                break
+        if source.size == target:
+            return source
+        return source.resize(target, Image.Resampling.LANCZOS)
+
+
+def load_preview(path, max_size=None):
+    """解码预览源图像
+
+    返回:
+        tuple: (成功标志, PreviewSource 或错误消息)
+    """
+    try:
+        return True, PreviewSource(path, max_size)
+    except Exception as e:
+        return False, f"显示图像失败: {str(e)}"
+
+
+def render_preview(source, box_width, box_height):
+    """生成预览图像
+
+    返回:
+        tuple: (成功标志, PIL.Image 或错误消息)
+    """
+    try:
+        return True, source.render(box_width, box_height)
+    except Exception as e:
+        return False, f"显示图像失败: {str(e)}"
+
+
+def load_thumbnail(path, size):
+    """解码缩略图（JPEG 使用 draft 模式按接近目标尺寸解码）
+
+    返回:
+        tuple: (成功标志, PIL.Image 或错误消息)
+    """
+    try:
+        with Image.open(path) as img:
+            img.draft("RGB", (size, size))
+            img.thumbnail((size, size), Image.Resampling.LANCZOS)
+            return True, img.convert("RGB") if img.mode not in ("RGB", "RGBA") else img.copy()
+    except Exception as e:
+        return False, f"显示图像失败: {str(e)}"
@@ -0,0 +1,198 @@
+# 客户端自适应限速：AIMD 调整速率的令牌桶、按优先级排队（界面请求优先于批量任务）以及按 referrer 的配额
+import contextlib
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from utils import load_config
+
+# 优先级，数值越小越先获得令牌
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BATCH = 2
+
+_state = threading.local()
+
+
+def current_priority():
+    """返回当前线程的请求优先级（默认 PRIORITY_NORMAL）"""
+    return getattr(_state, "priority", PRIORITY_NORMAL)
+
+
+def set_priority(level):
+    """设置当前线程的请求优先级，可用作线程池的 initializer"""
+    _state.priority = PRIORITY_NORMAL if level is None else level
+
+
+@contextlib.contextmanager
+def priority(level):
+    """在 with 块中临时使用指定的请求优先级"""
+    previous = current_priority()
+    set_priority(level)
+    try:
+        yield
+    finally:
+        set_priority(previous)
+
+
+class AdaptiveRateLimiter:
+    """自适应令牌桶限速器（线程安全）
+
+    令牌按当前速率补充；请求成功时速率加性增加，遇到 429/503 或耗时超过目标时乘性减小（AIMD），
+    服务端返回 Retry-After 时暂停发放令牌直到指定时间。等待令牌的请求按 (优先级, 到达顺序) 排队，
+    只有队首可以取得令牌。指定了配额的 referrer 另外按固定速率限速。
+    """
+
+    def __init__(self, initial_rate=2.0, min_rate=0.1, max_rate=20.0, increase=0.5, decrease=0.5,
+                 burst=None, latency_target=None, cooldown=2.0, referrer_quotas=None):
+        """
+        参数:
+            initial_rate (float): 初始速率（每秒请求数）
+            min_rate (float): 速率下限
+            max_rate (float): 速率上限
+            increase (float): 加性增长量，约为每秒成功请求带来的速率增量
+            decrease (float): 乘性减小系数（0-1）
+            burst (float, optional): 令牌桶容量，默认等于当前速率（至少 1）
+            latency_target (float, optional): 首字节耗时目标（秒），超过时视为拥塞
+            cooldown (float): 两次减速之间的最短间隔（秒），避免同一批限流响应使速率连续减半
+            referrer_quotas (dict, optional): referrer -> 每秒最大请求数
+        """
+        self.rate = float(initial_rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.referrer_quotas = dict(referrer_quotas or {})
+        self._cond = threading.Condition()
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._waiters = []  # (优先级, 序号) 小顶堆
+        self._seq = itertools.count()
+        self._referrer_next = {}  # referrer -> 下一次允许请求的时间
+        self.throttled = 0
+
+    def _capacity(self):
+        return self.burst if self.burst else max(1.0, self.rate)
+
+    def _refill(self, now):
+        self._tokens = min(self._capacity(), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _wait_referrer(self, referrer):
+        """按 referrer 配额等待（不占用全局队列，配额用尽的 referrer 不会阻塞其他请求）"""
+        quota = self.referrer_quotas.get(referrer)
+        if not quota:
+            return
+        with self._cond:
+            now = time.monotonic()
+            start = max(now, self._referrer_next.get(referrer, now))
+            self._referrer_next[referrer] = start + 1.0 / quota
+        if start > now:
+            time.sleep(start - now)
+
+    def acquire(self, priority=None, referrer=""):
+        """阻塞直到可以发送请求
+
+        参数:
+            priority (int, optional): 请求优先级，默认使用当前线程的优先级
+            referrer (str): 请求的 referrer，用于按配额限速
+
+        返回:
+            float: 等待的时间（秒）
+        """
+        started = time.monotonic()
+        self._wait_referrer(referrer)
+        ticket = (current_priority() if priority is None else priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    timeout = None
+                    if self._waiters[0] == ticket:
+                        now = time.monotonic()
+                        self._refill(now)
+                        if now < self._paused_until:
+                            timeout = self._paused_until - now
+                        elif self._tokens >= 1.0:
+                            self._tokens -= 1.0
+                            break
+                        else:
+                            timeout = (1.0 - self._tokens) / self.rate
+                    self._cond.wait(timeout)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+        return time.monotonic() - started
+
+    def on_response(self, status, latency=None, retry_after=None):
+        """根据响应调整速率
+
+        参数:
+            status (int or None): HTTP 状态码，连接错误时为 None（不调整）
+            latency (float, optional): 首字节耗时（秒）
+            retry_after (float, optional): 服务端要求的等待时间（秒）
+        """
+        if not isinstance(status, int):
+            return
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            congested = status in (429, 503) or (
+                status < 400 and self.latency_target and latency is not None and latency > self.latency_target)
+            if status in (429, 503):
+                self.throttled += 1
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+            if congested:
+                if now - self._last_decrease >= self.cooldown:
+                    self._last_decrease = now
+                    self.rate = max(self.min_rate, self.rate * self.decrease)
+                    self._tokens = min(self._tokens, self._capacity())
+                    logging.warning("上游限流或响应变慢 (状态 %d)，速率降为 %.2f/s", status, self.rate)
+            elif status < 400:
+                self.rate = min(self.max_rate, self.rate + self.increase / max(self.rate, 1.0))
+            self._cond.notify_all()
+
+    def stats(self):
+        """返回当前速率、可用令牌、排队请求数和累计限流次数"""
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "rate": round(self.rate, 3),
+                "tokens": round(self._tokens, 3),
+                "waiting": len(self._waiters),
+                "throttled": self.throttled,
+                "paused": max(0.0, round(self._paused_until - time.monotonic(), 3)),
+            }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """返回进程内共享的限速器，config.json 中 rate_limit_enabled 为 false 时返回 None"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                config = load_config()
+                if config.get("rate_limit_enabled", True):
+                    _limiter = AdaptiveRateLimiter(
+                        initial_rate=config.get("rate_limit_initial", 2.0),
+                        min_rate=config.get("rate_limit_min", 0.1),
+                        max_rate=config.get("rate_limit_max", 20.0),
+                        latency_target=config.get("rate_limit_latency_target"),
+                        referrer_quotas=config.get("referrer_quotas"),
+                    )
+                else:
+                    _limiter = False
+    return _limiter or None
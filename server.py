@@ -0,0 +1,213 @@
+# 本地 HTTP 服务：多个客户端共享同一个已预热的客户端连接池、结果缓存和进行中请求合并
+import json
+import logging
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import api
+from cache import get_cache
+from generation import GenerationRequest
+from metrics import get_metrics
+from models import get_catalogue
+from ratelimit import get_limiter
+
+# 每次写入响应的字节数
+CHUNK_SIZE = 64 * 1024
+
+# 布尔参数
+BOOL_FIELDS = ("nologo", "enhance", "private", "safe")
+
+
+def _sniff_content_type(data):
+    """根据文件头判断图像类型"""
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+def parse_generate_request(path, query, config):
+    """从请求路径和查询参数中解析生成请求
+
+    支持 /generate?prompt=...&width=... 和与上游相同的 /prompt/<提示词>?width=... 两种形式，
+    未给出的参数使用 config.json 中的默认值。
+
+    返回:
+        GenerationRequest: 已验证的请求
+
+    异常:
+        ValueError: 参数缺失或无效
+    """
+    values = {key: items[-1] for key, items in urllib.parse.parse_qs(query, keep_blank_values=True).items()}
+    if path.startswith("/prompt/"):
+        values["prompt"] = urllib.parse.unquote(path[len("/prompt/"):])
+    if not values.get("prompt", "").strip():
+        raise ValueError("缺少 prompt 参数")
+    params = {
+        "prompt": values["prompt"],
+        "width": values.get("width", config.get("default_width", 1024)),
+        "height": values.get("height", config.get("default_height", 1024)),
+        "seed": values.get("seed", 42),
+        "model": values.get("model", config.get("default_model", "flux")),
+        "referrer": values.get("referrer", ""),
+    }
+    for field in BOOL_FIELDS:
+        params[field] = values.get(field, config.get(f"default_{field}", field in ("nologo", "safe")))
+    return GenerationRequest(**params)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "PollinationsLocal/1.0"
+
+    def do_GET(self):
+        started = time.perf_counter()
+        url = urllib.parse.urlsplit(self.path)
+        try:
+            if url.path == "/generate" or url.path.startswith("/prompt/"):
+                self._generate(url)
+            elif url.path == "/models":
+                self._models()
+            elif url.path == "/health":
+                self._health()
+            elif url.path == "/metrics":
+                self._metrics(url.query)
+            else:
+                self._send_json(404, {"error": "未找到"})
+        except (BrokenPipeError, ConnectionResetError):
+            logging.warning("客户端提前断开连接: %s", self.path)
+        logging.info("%s %s %s %.3fs", self.address_string(), self.command, url.path, time.perf_counter() - started)
+
+    def _generate(self, url):
+        try:
+            request = parse_generate_request(url.path, url.query, self.server.config)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        # 相同参数的结果是确定的，以请求的规范化键作为 ETag，客户端重复请求时无需传输图像
+        etag = f'"{request.key}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if not self.server.slots.acquire(timeout=self.server.queue_timeout):
+            self._send_json(503, {"error": "服务繁忙，请稍后重试"}, {"Retry-After": "1"})
+            return
+        try:
+            # 通过 api 复用共享连接池、结果缓存和进行中请求合并
+            success, result = api.generate_request(request)
+        finally:
+            self.server.slots.release()
+        if not success:
+            self._send_json(502, {"error": result})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", _sniff_content_type(result))
+        self.send_header("Content-Length", str(len(result)))
+        self.send_header("ETag", etag)
+        # 私有生成不允许共享缓存和代理保存
+        self.send_header("Cache-Control", "private, no-store" if request.private else "public, max-age=31536000, immutable")
+        self.end_headers()
+        view = memoryview(result)
+        for offset in range(0, len(view), CHUNK_SIZE):
+            self.wfile.write(view[offset:offset + CHUNK_SIZE])
+
+    def _models(self):
+        catalogue = get_catalogue()
+        if not catalogue.is_fresh():
+            catalogue.refresh_in_background()
+        self._send_json(200, catalogue.models)
+
+    def _health(self):
+        cache = get_cache()
+        limiter = get_limiter()
+        self._send_json(200, {
+            "status": "ok",
+            "uptime": round(time.time() - self.server.started, 3),
+            "inflight": api._inflight.inflight_count(),
+            "cache": cache.stats() if cache is not None else None,
+            "rate_limit": limiter.stats() if limiter is not None else None,
+        })
+
+    def _metrics(self, query):
+        if urllib.parse.parse_qs(query).get("format") == ["json"]:
+            self._send_json(200, get_metrics().snapshot())
+            return
+        body = get_metrics().to_prometheus().encode("utf-8")
+        self._send(200, body, "text/plain; version=0.0.4; charset=utf-8")
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json; charset=utf-8", headers)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 访问日志由 do_GET 统一记录
+        pass
+
+
+class GenerationServer(ThreadingHTTPServer):
+    """本地图像生成 HTTP 服务
+
+    接口:
+        GET /generate?prompt=...&width=&height=&seed=&model=&referrer=&nologo=&enhance=&private=&safe=
+        GET /prompt/<提示词>?width=...   与上游相同的路径形式
+        GET /models                      可用模型列表
+        GET /health                      运行状态、进行中请求数、缓存和限速器状态
+        GET /metrics                     Prometheus 文本格式指标（?format=json 为 JSON）
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=8765, max_concurrency=16, queue_timeout=30.0, config=None):
+        """
+        参数:
+            host (str): 监听地址
+            port (int): 监听端口，0 表示随机端口
+            max_concurrency (int): 同时向上游请求的最大生成数，超出的请求排队等待
+            queue_timeout (float): 排队等待的最长时间（秒），超时返回 503
+            config (dict, optional): 默认参数，通常为 load_config() 的结果
+        """
+        super().__init__((host, port), _Handler)
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.queue_timeout = queue_timeout
+        self.config = config or {}
+        self.started = time.time()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def serve(host="127.0.0.1", port=8765, max_concurrency=16, config=None):
+    """启动服务并阻塞，直到收到 Ctrl+C"""
+    server = GenerationServer(host, port, max_concurrency=max_concurrency, config=config)
+    logging.info("本地服务已启动: %s", server.url)
+    print(f"本地服务已启动: {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        cache = get_cache()
+        if cache is not None:
+            cache.flush()
+        logging.info("本地服务已停止")
@@ -0,0 +1,61 @@
+# 进行中请求合并：相同参数的并发调用只发送一次请求，共享同一结果
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """按键合并并发调用
+
+    第一个调用者执行实际的函数，其余相同键的并发调用者等待同一个 Future 并得到相同的结果。
+    函数完成后键即被移除，之后的调用会重新执行（结果复用交给缓存层处理）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Future
+
+    def _claim(self, key):
+        """返回 (future, 是否为第一个调用者)"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            # 标记为运行中，之后任何等待者取消等待都不会取消共享的 Future
+            future.set_running_or_notify_cancel()
+            self._inflight[key] = future
+            return future, True
+
+    def _run(self, key, future, func, args, kwargs):
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def do(self, key, func, *args, **kwargs):
+        """线程调用：执行 func 或等待相同键的进行中调用，返回其结果"""
+        future, leader = self._claim(key)
+        if leader:
+            self._run(key, future, func, args, kwargs)
+        return future.result()
+
+    async def do_async(self, key, func, *args, executor=None, **kwargs):
+        """asyncio 调用：与线程调用共享同一批进行中的请求
+
+        第一个调用者在线程池中执行阻塞的 func，等待期间不阻塞事件循环。
+        取消某个调用者的等待（例如 wait_for 超时）只影响该调用者，其他调用者仍会得到结果。
+        """
+        future, leader = self._claim(key)
+        if leader:
+            loop = asyncio.get_running_loop()
+            loop.run_in_executor(executor, self._run, key, future, func, args, kwargs)
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def inflight_count(self):
+        """返回当前进行中的键数量"""
+        with self._lock:
+            return len(self._inflight)
@@ -0,0 +1,280 @@
+# 种子/参数扫描：展开参数组合，并在预览画布中以虚拟化缩略图网格逐步显示结果
+import functools
+import itertools
+import logging
+import re
+
+
+
+_SEED_PART = re.compile(r"^(\d+)(?:\s*-\s*(\d+))?$")
+
+
+def parse_seed_range(text):
+    """解析种子范围，例如 "1-16"、"1,5,9" 或 "1-4,10"
+
+    返回:
+        list: range 列表（不展开为种子，很大的范围也不占用内存），种子数用 seed_count 计算
+
+    异常:
+        ValueError: 格式错误、种子为负数或范围的结束小于开始
+    """
+    seeds = []
+    for part in text.replace("，", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        match = _SEED_PART.match(part)
+        if match is None:
+            raise ValueError(f"种子范围无效: {part}（种子为非负整数，格式如 1-16 或 1,5,9）")
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) is not None else start
+        if end < start:
+            raise ValueError(f"种子范围无效: {part}（结束小于开始）")
+        seeds.append(range(start, end + 1))
+    return seeds
+
+
+def seed_count(seeds):
+    """返回 parse_seed_range 结果中的种子总数"""
+    return sum(len(part) for part in seeds)
+
+
+def parse_sizes(text):
+    """解析尺寸列表，例如 "1024x1024, 768x1344"，返回 [(宽, 高), ...]"""
+    sizes = []
+    for part in text.replace("，", ",").split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        width, height = part.replace("*", "x").split("x", 1)
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def parse_list(text):
+    """解析逗号分隔的字符串列表"""
+    return [item.strip() for item in text.replace("，", ",").split(",") if item.strip()]
+
+
+def expand_sweep(base, seeds=None, sizes=None, models=None, max_jobs=None):
+    """展开扫描参数组合
+
+    参数:
+        base (GenerationRequest): 已验证的基础请求
+        seeds (list, optional): parse_seed_range 返回的种子范围列表，为空时使用 base 中的种子
+        sizes (list, optional): [(宽, 高), ...]，为空时使用 base 中的尺寸
+        models (list, optional): 模型列表，为空时使用 base 中的模型
+        max_jobs (int, optional): 组合数上限，在展开任何组合之前检查
+
+    返回:
+        list: GenerationRequest 列表，按 模型 -> 尺寸 -> 种子 的顺序排列，共用 base 已编码的提示词路径
+
+    异常:
+        ValueError: 组合数超过上限，或某个组合的参数无效（例如尺寸超出 256-4096）
+    """
+    seeds = seeds or [range(base.seed, base.seed + 1)]
+    sizes = sizes or [(base.width, base.height)]
+    models = models or [base.model]
+    # 按范围长度计算组合数，超过上限时不展开种子列表
+    total = seed_count(seeds) * len(sizes) * len(models)
+    if max_jobs is not None and total > max_jobs:
+        raise ValueError(f"扫描组合数 {total} 超过上限 {max_jobs}")
+    # 基础请求只验证一次，各组合只验证变化的字段
+    return [
+        base.replace(model=model, width=width, height=height, seed=seed)
+        for model, (width, height), seed in itertools.product(models, sizes, itertools.chain.from_iterable(seeds))
+    ]
+
+
+def sweep_label(request, base):
+    """缩略图下方的简短标签，只显示与基础请求不同的参数"""
+    parts = []
+    if request.model != base.model:
+        parts.append(request.model)
+    if (request.width, request.height) != (base.width, base.height):
+        parts.append(f"{request.width}x{request.height}")
+    parts.append(f"#{request.seed}")
+    return " ".join(parts)
+
+
+class ThumbnailGrid:
+    """在画布上显示的虚拟化缩略图网格
+
+    所有格子只绘制轻量的矩形和文字；只有位于可见区域（及上下各一行）的已完成格子
+    才会在后台解码缩略图并持有 PhotoImage，滚出可见区域后立即释放。
+    """
+
+    def __init__(self, canvas, scrollbar, executor, thumb_size=160, on_select=None):
+        """
+        参数:
+            canvas (tk.Canvas): 预览画布
+            scrollbar (ttk.Scrollbar): 纵向滚动条
+            executor (GenerationExecutor): 解码缩略图的后台执行器
+            thumb_size (int): 缩略图边长（像素）
+            on_select (callable, optional): 点击已完成格子时调用，参数为 (GenerationRequest, 图像路径)
+        """
+        self.canvas = canvas
+        self.scrollbar = scrollbar
+        self.executor = executor
+        self.thumb_size = thumb_size
+        self.on_select = on_select
+        self.pad = 8
+        self.label_height = 18
+        self.cells = []
+        self.columns = 1
+        self.active = False
+        self.token = 0
+        self.refresh_after_id = None
+
+    @property
+    def cell_width(self):
+        return self.thumb_size + self.pad
+
+    @property
+    def cell_height(self):
+        return self.thumb_size + self.label_height + self.pad
+
+    def start(self, jobs, labels):
+        """开始新的扫描，为每个请求创建一个格子"""
+        self.clear()
+        self.active = True
+        self.token += 1
+        self.cells = [
+            {"request": request, "label": label, "path": None, "status": "pending",
+             "photo": None, "loading": False, "items": None}
+            for request, label in zip(jobs, labels)
+        ]
+        self.canvas.configure(yscrollcommand=self._on_scroll)
+        self.scrollbar.configure(command=self.canvas.yview)
+        self.scrollbar.pack(side="right", fill="y", before=self.canvas)
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", self._on_wheel)
+        self.canvas.bind("<Button-5>", self._on_wheel)
+        self.canvas.yview_moveto(0)
+        self.layout()
+
+    def clear(self):
+        """退出扫描模式，删除所有格子并释放缩略图"""
+        self.active = False
+        self.token += 1
+        self.canvas.delete("thumb")
+        for cell in self.cells:
+            cell["photo"] = None
+        self.cells = []
+        self.canvas.configure(yscrollcommand="", scrollregion=(0, 0, 0, 0))
+        self.canvas.yview_moveto(0)
+        self.scrollbar.pack_forget()
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.canvas.unbind(sequence)
+
+    def layout(self):
+        """按画布宽度重新排列格子（窗口大小变化时调用）"""
+        if not self.active:
+            return
+        self.canvas.delete("thumb")
+        self.columns = max(1, (self.canvas.winfo_width() - self.pad) // self.cell_width)
+        rows = (len(self.cells) + self.columns - 1) // self.columns
+        self.canvas.configure(scrollregion=(0, 0, self.columns * self.cell_width + self.pad, rows * self.cell_height + self.pad))
+        for index, cell in enumerate(self.cells):
+            x, y = self._origin(index)
+            tag = f"cell{index}"
+            rect = self.canvas.create_rectangle(x, y, x + self.thumb_size, y + self.thumb_size,
+                                                outline="#cccccc", fill="#f2f2f2", tags=("thumb", tag))
+            image = self.canvas.create_image(x + self.thumb_size // 2, y + self.thumb_size // 2, tags=("thumb", tag))
+            text = self.canvas.create_text(x + self.thumb_size // 2, y + self.thumb_size + self.label_height // 2 + 2,
+                                           text=self._cell_text(cell), tags=("thumb", tag))
+            cell["items"] = (rect, image, text)
+            cell["photo"] = None
+            cell["loading"] = False
+            self.canvas.tag_bind(tag, "<Button-1>", functools.partial(self._on_click, index))
+        self.refresh_visible()
+
+    def _origin(self, index):
+        row, column = divmod(index, self.columns)
+        return self.pad + column * self.cell_width, self.pad + row * self.cell_height
+
+    def _cell_text(self, cell):
+        if cell["status"] == "pending":
+            return f"{cell['label']} …"
+        if cell["status"] == "error":
+            return f"{cell['label']} 失败"
+        return cell["label"]
+
+    def set_result(self, token, index, success, result):
+        """某个组合生成完成，result 为图像路径或错误消息；token 与当前扫描不符时忽略"""
+        if not self.active or token != self.token or index >= len(self.cells):
+            return
+        cell = self.cells[index]
+        cell["status"] = "done" if success else "error"
+        cell["path"] = result if success else None
+        if cell["items"]:
+            self.canvas.itemconfigure(cell["items"][2], text=self._cell_text(cell))
+        if not success:
+            logging.error(f"扫描任务失败 {cell['label']}: {result}")
+        self.refresh_visible()
+
+    def progress(self):
+        """返回 (已完成数, 总数)"""
+        return sum(1 for cell in self.cells if cell["status"] != "pending"), len(self.cells)
+
+    def _visible_range(self):
+        """返回可见格子的序号范围（上下各多加载一行）"""
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first_row = max(0, int(top // self.cell_height) - 1)
+        last_row = int(bottom // self.cell_height) + 1
+        return first_row * self.columns, min(len(self.cells), (last_row + 1) * self.columns)
+
+    def refresh_visible(self):
+        """为可见格子解码缩略图，释放不可见格子的 PhotoImage"""
+        self.refresh_after_id = None
+        if not self.active:
+            return
+        first, last = self._visible_range()
+        for index, cell in enumerate(self.cells):
+            visible = first <= index < last
+            if visible and cell["status"] == "done" and cell["photo"] is None and not cell["loading"]:
+                cell["loading"] = True
+                # 延迟导入 Pillow 相关模块
+                from preview import load_thumbnail
+                self.executor.submit(
+                    load_thumbnail, cell["path"], self.thumb_size,
+                    callback=functools.partial(self._on_thumbnail, index, self.token)
+                )
+            elif not visible and cell["photo"] is not None:
+                cell["photo"] = None
+                self.canvas.itemconfigure(cell["items"][1], image="")
+
+    def _on_thumbnail(self, index, token, outcome):
+        """缩略图解码完成，在主线程中创建 PhotoImage"""
+        if token != self.token or index >= len(self.cells):
+            return
+        cell = self.cells[index]
+        cell["loading"] = False
+        success, result = outcome
+        if not success:
+            logging.error(f"缩略图解码失败: {result}")
+            return
+        first, last = self._visible_range()
+        if not first <= index < last or cell["items"] is None:
+            return
+        from PIL import ImageTk
+        cell["photo"] = ImageTk.PhotoImage(result)
+        self.canvas.itemconfigure(cell["items"][1], image=cell["photo"])
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        # 滚动时合并多次刷新
+        if self.refresh_after_id is None:
+            self.refresh_after_id = self.canvas.after(50, self.refresh_visible)
+
+    def _on_wheel(self, event):
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self.canvas.yview_scroll(-1, "units")
+        else:
+            self.canvas.yview_scroll(1, "units")
+
+    def _on_click(self, index, event):
+        cell = self.cells[index]
+        if cell["status"] == "done" and self.on_select is not None:
+            self.on_select(cell["request"], cell["path"])
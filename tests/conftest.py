@@ -0,0 +1,65 @@
+# 测试从仓库根目录导入模块
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api
+import benchmark
+import cache
+import client
+import history
+import utils
+from singleflight import SingleFlight
+
+
+class StubCounter:
+    """统计桩服务器收到的图像请求数"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self):
+        with self._lock:
+            self.count += 1
+
+
+@pytest.fixture
+def isolated(tmp_path, monkeypatch):
+    """在临时目录中运行，替换共享的配置、缓存、历史索引和进行中请求表，测试之间互不影响"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(utils, "_config", {"default_width": 512, "default_height": 512, "default_model": "flux"})
+    monkeypatch.setattr(utils, "_filename_allocator", utils._SequenceAllocator(str(tmp_path / "Images")))
+    monkeypatch.setattr(cache, "_cache", False)
+    monkeypatch.setattr(history, "_history", False)
+    monkeypatch.setattr(api, "_inflight", SingleFlight())
+    return tmp_path
+
+
+@pytest.fixture
+def stub(isolated, monkeypatch):
+    """启动本地桩服务器，并让共享客户端指向它（不限速、不退避）
+
+    返回的服务器带有 settings（可在测试中修改延迟、错误率等）和 requests（StubCounter）。
+    """
+    counter = StubCounter()
+    do_get = benchmark._StubHandler.do_GET
+
+    def counting_get(handler):
+        if handler.path.startswith("/prompt/"):
+            counter.add()
+        do_get(handler)
+
+    monkeypatch.setattr(benchmark._StubHandler, "do_GET", counting_get)
+    with benchmark.StubServer(benchmark.StubSettings(latency=0.01, payload_size=4096)) as server:
+        server.settings = server.httpd.settings
+        server.requests = counter
+        shared = client.PollinationsClient(base_url=server.base_url, max_retries=2, backoff_factor=0.0,
+                                           connect_timeout=2, read_timeout=2)
+        monkeypatch.setattr(client, "_client", shared)
+        yield server
+        shared.close()
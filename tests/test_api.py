@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+import requests
+
+import api
+import cache
+import client
+from cache import ResultCache
+from generation import GenerationRequest
+
+
+def run_concurrently(func, count):
+    results = [None] * count
+
+    def call(i):
+        results[i] = func(i)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+def test_generate_request_returns_image_and_reports_errors(stub):
+    request = GenerationRequest("cat", 512, 512, 1)
+    assert api.generate_request(request) == (True, stub.settings.payload)
+    stub.settings.error_rate = 1.0
+    success, message = api.generate_request(request.replace(seed=2))
+    assert not success and message.startswith("错误:")
+    assert api.generate_image("", 512, 512, 1)[0] is False
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_concurrent_streaming_downloads_are_coalesced(stub, isolated, monkeypatch, cached):
+    if cached:
+        monkeypatch.setattr(cache, "_cache", ResultCache(str(isolated / "cache"), flush_interval=60))
+    stub.settings.latency = 0.3
+    request = GenerationRequest("cat", 512, 512, 1)
+    results = run_concurrently(
+        lambda i: api.generate_request_to_file(request, path=str(isolated / f"out{i}.jpg")), 4)
+    assert stub.requests.count == 1
+    assert [result[0] for result in results] == [True] * 4
+    for i, (_, path) in enumerate(results):
+        assert path == str(isolated / f"out{i}.jpg")
+        with open(path, "rb") as f:
+            assert f.read() == stub.settings.payload
+    assert not list(isolated.glob("*.part"))
+
+
+def test_streaming_uses_cache_and_allocated_name(stub, isolated, monkeypatch):
+    monkeypatch.setattr(cache, "_cache", ResultCache(str(isolated / "cache"), flush_interval=60))
+    request = GenerationRequest("cat", 512, 512, 1)
+    first = api.generate_request_to_file(request)
+    second = api.generate_request_to_file(request)
+    assert first[0] and second[0] and first[1] != second[1]
+    assert stub.requests.count == 1
+
+
+def test_failed_download_removes_allocated_file(stub, isolated):
+    stub.settings.error_rate = 1.0
+    success, _ = api.generate_request_to_file(GenerationRequest("cat", 512, 512, 1))
+    assert not success
+    assert not list((isolated / "Images").iterdir())
+
+
+def test_client_retries_throttled_responses_then_raises(stub):
+    stub.settings.throttle_rate = 1.0
+    stats = {}
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get_client().get("/prompt/cat", stats=stats)
+    assert stub.requests.count == 3
+    assert (stats["retries"], stats["status"]) == (2, 429)
+
+
+def test_client_does_not_retry_read_timeouts(stub, monkeypatch):
+    stub.settings.latency = 0.5
+    monkeypatch.setattr(client.get_client(), "timeout", (2, 0.1))
+    stats = {}
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.get_client().get("/prompt/cat", stats=stats)
+    assert stub.requests.count == 1
+    assert stats["status"] == "ReadTimeout"
@@ -0,0 +1,77 @@
+import json
+import os
+
+import history
+from batch import generate_batch
+from cli import read_completed_lines, run_jsonl_batch
+from generation import GenerationRequest
+from history import HistoryIndex
+
+
+def write_lines(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + "\n")
+
+
+def read_results(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_generate_batch_writes_files_and_history(stub, isolated, monkeypatch):
+    index = HistoryIndex(str(isolated / "history.sqlite"))
+    monkeypatch.setattr(history, "_history", index)
+    records = []
+    specs = [GenerationRequest("cat", 512, 512, seed) for seed in range(3)]
+    specs.append({"prompt": "dog", "width": 512, "height": 512, "seed": 1, "path": str(isolated / "dog.jpg")})
+    specs.append({"prompt": "", "width": 512, "height": 512, "seed": 1})
+    summary = generate_batch(specs, output_dir=str(isolated / "out"), concurrency=2, on_result=records.append)
+    assert (summary["total"], summary["succeeded"], summary["failed"]) == (5, 4, 1)
+    ok = [record for record in records if record["success"]]
+    assert all(record["bytes"] == len(stub.settings.payload) for record in ok)
+    assert str(isolated / "dog.jpg") in [record["path"] for record in ok]
+    for record in ok:
+        assert index.find_by_path(record["path"])["success"] == 1
+    index.close()
+
+
+def test_jsonl_batch_resumes_without_repeating_completed_lines(stub, isolated):
+    jobs = str(isolated / "jobs.jsonl")
+    write_lines(jobs, [
+        json.dumps({"prompt": "cat", "id": "a"}),
+        json.dumps({"width": 512}),
+        "",
+        json.dumps({"prompt": "dog", "seed": 3}),
+    ])
+    summary = run_jsonl_batch(jobs, output_dir=str(isolated / "out"), concurrency=2)
+    results = read_results(summary["results"])
+    assert sorted((r["line"], r["status"]) for r in results) == [(1, "ok"), (2, "invalid"), (4, "ok")]
+    assert {r["line"]: r.get("id") for r in results}[1] == "a"
+    for result in results:
+        if result["status"] == "ok":
+            assert os.path.getsize(result["path"]) == result["bytes"]
+    assert stub.requests.count == 2
+
+    summary = run_jsonl_batch(jobs, output_dir=str(isolated / "out"), concurrency=2)
+    assert (summary["total"], summary["skipped"]) == (0, 3)
+    assert stub.requests.count == 2
+    assert len(read_results(summary["results"])) == 3
+
+
+def test_jsonl_batch_retries_failed_lines_and_tolerates_truncated_results(stub, isolated):
+    jobs = str(isolated / "jobs.jsonl")
+    results_path = str(isolated / "jobs.results.jsonl")
+    write_lines(jobs, [json.dumps({"prompt": f"job {i}"}) for i in range(1, 4)])
+    # 上次运行中第 1 行成功、第 2 行失败，写第 3 行时进程崩溃
+    write_lines(results_path, [
+        json.dumps({"line": 1, "status": "ok"}),
+        json.dumps({"line": 2, "status": "error", "error": "500"}),
+    ])
+    with open(results_path, "a", encoding="utf-8") as f:
+        f.write('{"line": 3, "sta')
+    assert read_completed_lines(results_path) == {1}
+    summary = run_jsonl_batch(jobs, output_dir=str(isolated / "out"))
+    assert (summary["total"], summary["succeeded"], summary["skipped"]) == (2, 2, 1)
+    assert stub.requests.count == 2
+    assert read_completed_lines(results_path) == {1, 2, 3}
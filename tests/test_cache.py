@@ -0,0 +1,90 @@
+import json
+import os
+import time
+
+import cache
+from cache import ResultCache
+
+
+def make_cache(directory, max_bytes=1024):
+    return ResultCache(cache_dir=str(directory), max_bytes=max_bytes, flush_interval=60)
+
+
+def test_put_get_and_content_deduplication(tmp_path):
+    store = make_cache(tmp_path)
+    store.put("a", b"x" * 10)
+    store.put("b", b"x" * 10)
+    assert store.get("a") == b"x" * 10
+    assert store.get("missing") is None
+    stats = store.stats()
+    assert (stats["entries"], stats["bytes"], stats["hits"], stats["misses"]) == (2, 10, 1, 1)
+    assert len(os.listdir(tmp_path / "blobs")) == 1
+
+
+def test_evicts_least_recently_used(tmp_path):
+    store = make_cache(tmp_path, max_bytes=25)
+    store.put("a", b"a" * 10)
+    store.put("b", b"b" * 10)
+    store.get("a")
+    store.put("c", b"c" * 10)
+    assert store.get("b") is None
+    assert store.get("a") == b"a" * 10
+    assert store.stats()["bytes"] == 20
+    assert len(os.listdir(tmp_path / "blobs")) == 2
+
+
+def test_copy_to_and_missing_blob_counts_as_miss(tmp_path):
+    store = make_cache(tmp_path)
+    store.put("a", b"data")
+    dest = tmp_path / "out.jpg"
+    assert store.copy_to("a", str(dest))
+    assert dest.read_bytes() == b"data"
+    for name in os.listdir(tmp_path / "blobs"):
+        os.remove(tmp_path / "blobs" / name)
+    assert not store.copy_to("a", str(dest))
+    assert store.stats()["entries"] == 0
+
+
+def test_index_persists_across_instances(tmp_path):
+    store = make_cache(tmp_path)
+    store.put("a", b"data")
+    store.flush()
+    assert make_cache(tmp_path).get("a") == b"data"
+
+
+def test_flush_merges_entries_written_by_another_instance(tmp_path):
+    first = make_cache(tmp_path)
+    second = make_cache(tmp_path)
+    first.put("a", b"aaaa")
+    first.flush()
+    second.put("b", b"bbbb")
+    second.flush()
+    with open(tmp_path / "index.json", encoding="utf-8") as f:
+        assert set(json.load(f)["entries"]) == {"a", "b"}
+    assert second.get("a") == b"aaaa"
+    assert make_cache(tmp_path).stats()["entries"] == 2
+
+
+def test_flush_keeps_entries_evicted_by_this_instance_removed(tmp_path):
+    first = make_cache(tmp_path, max_bytes=10)
+    first.put("a", b"a" * 6)
+    first.flush()
+    second = make_cache(tmp_path, max_bytes=10)
+    second.put("b", b"b" * 6)
+    second.flush()
+    with open(tmp_path / "index.json", encoding="utf-8") as f:
+        assert set(json.load(f)["entries"]) == {"b"}
+
+
+def test_old_orphaned_blobs_are_removed_on_start(tmp_path):
+    store = make_cache(tmp_path)
+    store.put("a", b"kept")
+    store.flush()
+    old = time.time() - cache.ORPHAN_AGE - 10
+    for name in ("orphan", "leftover.tmp"):
+        path = tmp_path / "blobs" / name
+        path.write_bytes(b"x")
+        os.utime(path, (old, old))
+    (tmp_path / "blobs" / "recent").write_bytes(b"x")
+    make_cache(tmp_path)
+    assert sorted(os.listdir(tmp_path / "blobs")) == sorted([store._lookup("a"), "recent"])
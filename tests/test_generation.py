@@ -0,0 +1,69 @@
+import pickle
+
+import pytest
+
+from generation import GenerationRequest
+
+
+def make_request(**changes):
+    values = {"prompt": "a red fox", "width": 1024, "height": 768, "seed": 7}
+    values.update(changes)
+    return GenerationRequest(**values)
+
+
+@pytest.mark.parametrize("changes", [
+    {"prompt": "  "},
+    {"width": 100},
+    {"height": 5000},
+    {"seed": "abc"},
+    {"seed": True},
+    {"model": ""},
+])
+def test_invalid_parameters_raise_value_error(changes):
+    with pytest.raises(ValueError):
+        make_request(**changes)
+
+
+def test_values_are_normalized():
+    request = make_request(width="512", seed="3", nologo="false", referrer=None)
+    assert (request.width, request.seed, request.nologo, request.referrer) == (512, 3, False, "")
+    assert request.params == {"width": 512, "height": 768, "seed": 3, "model": "flux", "nologo": "false",
+                              "enhance": "false", "private": "false", "safe": "true"}
+    assert make_request(referrer="app").params["referrer"] == "app"
+
+
+def test_request_is_immutable():
+    request = make_request()
+    with pytest.raises(AttributeError):
+        request.seed = 8
+
+
+def test_key_is_stable_and_depends_on_every_parameter():
+    request = make_request()
+    assert request.key == make_request().key
+    assert request == make_request()
+    assert hash(request) == hash(make_request())
+    assert request.key != make_request(seed=8).key
+    assert request.key != make_request(model="turbo").key
+
+
+def test_replace_validates_changed_fields_and_reuses_encoded_path():
+    request = make_request(prompt="a fox & a hound")
+    path = request.path
+    variant = request.replace(seed=9, width="2048")
+    assert (variant.seed, variant.width, variant.height) == (9, 2048, 768)
+    assert variant.path is path
+    assert variant == make_request(prompt="a fox & a hound", seed=9, width=2048)
+    assert request.replace(prompt="other").path == "/prompt/other"
+    with pytest.raises(ValueError):
+        request.replace(width=10)
+    with pytest.raises(TypeError):
+        request.replace(colour="red")
+
+
+def test_from_dict_ignores_unknown_keys_and_pickle_round_trips():
+    request = GenerationRequest.from_dict({"prompt": "x", "width": 512, "height": 512, "seed": 1, "path": "out.jpg"})
+    assert request.to_dict()["prompt"] == "x"
+    copy = pickle.loads(pickle.dumps(request))
+    assert copy == request
+    assert copy.params == request.params
@@ -0,0 +1,56 @@
+import threading
+import time
+
+from ratelimit import PRIORITY_BATCH, PRIORITY_INTERACTIVE, AdaptiveRateLimiter, current_priority, priority
+
+
+def test_interactive_requests_are_served_before_queued_batch_requests():
+    limiter = AdaptiveRateLimiter(initial_rate=4.0)
+    limiter.acquire()
+    order = []
+
+    def take(level, name):
+        limiter.acquire(priority=level)
+        order.append(name)
+
+    batch = threading.Thread(target=take, args=(PRIORITY_BATCH, "batch"))
+    batch.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=take, args=(PRIORITY_INTERACTIVE, "interactive"))
+    interactive.start()
+    batch.join(5)
+    interactive.join(5)
+    assert order == ["interactive", "batch"]
+
+
+def test_throttling_decreases_rate_once_per_cooldown_and_success_increases_it():
+    limiter = AdaptiveRateLimiter(initial_rate=4.0, decrease=0.5, cooldown=60)
+    limiter.on_response(429)
+    limiter.on_response(503)
+    assert limiter.rate == 2.0
+    assert limiter.stats()["throttled"] == 2
+    limiter.on_response(200, latency=0.1)
+    assert limiter.rate > 2.0
+    limiter.on_response(None)
+    assert limiter.stats()["throttled"] == 2
+
+
+def test_slow_responses_count_as_congestion_and_rate_is_bounded():
+    limiter = AdaptiveRateLimiter(initial_rate=1.0, min_rate=0.5, latency_target=1.0, cooldown=0)
+    for _ in range(5):
+        limiter.on_response(200, latency=2.0)
+    assert limiter.rate == 0.5
+
+
+def test_retry_after_pauses_token_issue():
+    limiter = AdaptiveRateLimiter(initial_rate=100.0, cooldown=0)
+    limiter.on_response(429, retry_after=0.3)
+    assert limiter.stats()["paused"] > 0
+    assert limiter.acquire() >= 0.25
+
+
+def test_priority_context_restores_previous_level():
+    before = current_priority()
+    with priority(PRIORITY_BATCH):
+        assert current_priority() == PRIORITY_BATCH
+    assert current_priority() == before
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", work))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [1]
+    assert results == ["result"] * 4
+    assert flight.inflight_count() == 0
+
+
+def test_exception_is_shared_and_key_released():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    for _ in range(2):
+        try:
+            flight.do("k", fail)
+        except ValueError as e:
+            assert str(e) == "boom"
+        else:
+            raise AssertionError("ValueError not raised")
+    assert flight.inflight_count() == 0
+
+
+def test_cancelled_async_leader_does_not_cancel_followers():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    thread_results = []
+
+    def work():
+        started.set()
+        release.wait(5)
+        return "result"
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async("k", work))
+        follower = asyncio.create_task(flight.do_async("k", work))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        thread = threading.Thread(target=lambda: thread_results.append(flight.do("k", work)))
+        thread.start()
+        leader.cancel()
+        try:
+            await leader
+        except asyncio.CancelledError:
+            pass
+        else:
+            raise AssertionError("leader not cancelled")
+        release.set()
+        result = await asyncio.wait_for(follower, 5)
+        await asyncio.get_running_loop().run_in_executor(None, thread.join, 5)
+        return result
+
+    assert asyncio.run(main()) == "result"
+    assert thread_results == ["result"]
+    assert flight.inflight_count() == 0
+
+
+def test_wait_for_timeout_only_affects_that_waiter():
+    flight = SingleFlight()
+
+    def work():
+        time.sleep(0.2)
+        return 42
+
+    async def main():
+        follower = asyncio.create_task(flight.do_async("k", work))
+        try:
+            await asyncio.wait_for(flight.do_async("k", work), 0.01)
+        except asyncio.TimeoutError:
+            pass
+        return await follower
+
+    assert asyncio.run(main()) == 42
@@ -0,0 +1,33 @@
+import pytest
+
+from generation import GenerationRequest
+from sweep import expand_sweep, parse_seed_range, parse_sizes, seed_count, sweep_label
+
+
+def test_parse_seed_range():
+    seeds = parse_seed_range("1-3, 10，12")
+    assert [list(part) for part in seeds] == [[1, 2, 3], [10], [12]]
+    assert seed_count(parse_seed_range("0-999999999")) == 1000000000
+    for text in ("3-1", "-1", "a"):
+        with pytest.raises(ValueError):
+            parse_seed_range(text)
+
+
+def test_expand_sweep_order_and_shared_path():
+    base = GenerationRequest("cat", 512, 512, 1)
+    jobs = expand_sweep(base, seeds=parse_seed_range("1-2"), sizes=parse_sizes("512x512, 768*1024"),
+                        models=["flux", "turbo"])
+    assert [(job.model, job.width, job.height, job.seed) for job in jobs[:3]] == [
+        ("flux", 512, 512, 1), ("flux", 512, 512, 2), ("flux", 768, 1024, 1)]
+    assert len(jobs) == 8
+    assert all(job.path is base.path for job in jobs)
+    assert [sweep_label(job, base) for job in (jobs[0], jobs[7])] == ["#1", "turbo 768x1024 #2"]
+
+
+def test_expand_sweep_checks_limit_before_expanding():
+    base = GenerationRequest("cat", 512, 512, 1)
+    with pytest.raises(ValueError):
+        expand_sweep(base, seeds=parse_seed_range("0-999999999"), max_jobs=100)
+    with pytest.raises(ValueError):
+        expand_sweep(base, sizes=[(100, 100)])
+    assert expand_sweep(base) == [base]
@@ -0,0 +1,48 @@
+import os
+import re
+import stat
+import threading
+
+from utils import _SequenceAllocator
+
+
+def test_concurrent_allocations_are_unique_and_created(tmp_path):
+    allocator = _SequenceAllocator(str(tmp_path))
+    paths = []
+    lock = threading.Lock()
+
+    def allocate():
+        for _ in range(25):
+            path = allocator.allocate()
+            with lock:
+                paths.append(path)
+
+    threads = [threading.Thread(target=allocate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert len(set(paths)) == 200
+    assert all(os.path.exists(path) for path in paths)
+    assert all(re.search(r"\d{4}-\d\d-\d\d_AI\d{4}\.jpg$", path) for path in paths)
+
+
+def test_new_allocator_continues_after_existing_files(tmp_path):
+    first = _SequenceAllocator(str(tmp_path))
+    for _ in range(3):
+        last = first.allocate()
+    # 另一个进程的分配器从目录中已有的最大序号之后继续
+    second = _SequenceAllocator(str(tmp_path))
+    assert second.allocate().endswith("_AI0004.jpg")
+    assert last.endswith("_AI0003.jpg")
+    # 两个分配器交替分配也不会重名
+    assert first.allocate().endswith("_AI0005.jpg")
+
+
+def test_allocated_files_follow_umask(tmp_path):
+    previous = os.umask(0o022)
+    try:
+        path = _SequenceAllocator(str(tmp_path)).allocate()
+    finally:
+        os.umask(previous)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
@@ -1,27 +1,108 @@
 # 工具函数（日志记录、图像处理等）
+import atexit
+import builtins
 import os
 import logging
+import logging.handlers
+import queue
+import re
+import sys
+import threading
+import time
 from datetime import datetime
-from PIL import Image
 import json
+import shutil
+
+_logging_configured = False
+_log_file = None
+_config = None
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """只把日志记录放入队列，消息的 % 格式化推迟到后台监听线程中进行"""
+
+    def prepare(self, record):
+        if record.exc_info and not record.exc_text:
+            # 异常堆栈在当前线程中格式化，避免持有 traceback 引用的局部变量
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON：time、level、logger、thread、message（以及 exc）"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _file_handler(log_file, config):
+    """按配置创建带轮转的文件处理器（log_rotation 为 "size"、"time" 或 "none"）"""
+    rotation = config.get("log_rotation", "size")
+    if rotation == "size":
+        return logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=int(config.get("log_max_mb", 10) * 1024 * 1024),
+            backupCount=config.get("log_backup_count", 5), encoding="utf-8", delay=True)
+    if rotation == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            log_file, when=config.get("log_when", "midnight"),
+            backupCount=config.get("log_backup_count", 5), encoding="utf-8", delay=True)
+    return logging.FileHandler(log_file, encoding="utf-8", delay=True)
+
 
 # 配置日志
 def setup_logging():
-    """初始化日志记录，保存到 logs/ 目录"""
+    """初始化日志记录，保存到 logs/ 目录（由程序入口调用，重复调用不会创建新的日志文件）
+
+    调用线程只把日志记录放入队列，格式化和文件、控制台写入由 QueueListener 的后台线程完成，
+    并发生成时磁盘和控制台 I/O 不会增加请求耗时。log_format 为 "json" 时文件中每行一条 JSON 记录。
+    """
+    global _logging_configured, _log_file
+    if _logging_configured:
+        return
+    _logging_configured = True
+    config = load_config()
     os.makedirs("logs", exist_ok=True)
-    log_file = f"logs/app_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        #handlers=[]  # 清空 handlers，禁用所有日志输出
-        handlers=[
-            logging.FileHandler(log_file, encoding="utf-8"),
-            logging.StreamHandler()
-        ]
-    )
+    log_file = _log_file = f"logs/app_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+    text_formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+    file_handler = _file_handler(log_file, config)
+    file_handler.setFormatter(JsonLinesFormatter() if config.get("log_format") == "json" else text_formatter)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(text_formatter)
+    #handlers = []  # 清空 handlers，禁用所有日志输出
+    handlers = [file_handler, console_handler]
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    root = logging.getLogger()
+    root.setLevel(config.get("log_level", "INFO"))
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    listener.start()
+    # 退出时写完队列中剩余的日志
+    atexit.register(listener.stop)
+
+def current_log_file():
+    """返回当前进程正在写入的日志文件路径，未初始化日志时返回 None"""
+    return _log_file
 
 def load_config():
-    """加载 config.json 中的默认参数"""
+    """加载 config.json 中的默认参数（只解析一次，之后返回同一份共享配置，调用方不应修改）"""
+    global _config
+    if _config is None:
+        _config = _read_config()
+    return _config
+
+def _read_config():
     try:
         with open("config.json", "r", encoding="utf-8") as f:
             return json.load(f)
@@ -37,30 +118,113 @@ def load_config():
             "default_safe": True
         }
 
+class StartupProfiler:
+    """启动耗时分析：记录各阶段时间点和首次导入各模块的耗时"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks = []
+        self.imports = []  # (模块名, 嵌套深度, 耗时)
+        self._depth = 0
+        self._original_import = None
+
+    def install(self):
+        """替换 builtins.__import__，统计首次导入的模块（含其依赖）的耗时"""
+        self._original_import = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules:
+                return self._original_import(name, globals, locals, fromlist, level)
+            depth = self._depth
+            self._depth += 1
+            start = time.perf_counter()
+            try:
+                return self._original_import(name, globals, locals, fromlist, level)
+            finally:
+                self._depth -= 1
+                self.imports.append((name, depth, time.perf_counter() - start))
+
+        builtins.__import__ = timed_import
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def mark(self, label):
+        """记录一个阶段完成的时间点"""
+        self.marks.append((label, time.perf_counter() - self.started))
+
+    def report(self, top=15):
+        """返回耗时报告文本"""
+        lines = ["启动耗时分析:"]
+        previous = 0.0
+        for label, elapsed in self.marks:
+            lines.append(f"  {label:<20} {elapsed * 1000:8.1f} ms  (+{(elapsed - previous) * 1000:.1f} ms)")
+            previous = elapsed
+        direct = sorted((item for item in self.imports if item[1] == 0), key=lambda item: item[2], reverse=True)
+        lines.append(f"首次导入耗时最多的模块（含依赖，共导入 {len(self.imports)} 个模块）:")
+        for name, _, elapsed in direct[:top]:
+            lines.append(f"  {name:<30} {elapsed * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+
+class _SequenceAllocator:
+    """按日期分配图像序号
+
+    每个日期首次使用时扫描一次目录，得到当天已有的最大序号，之后在内存中递增；
+    通过 O_CREAT|O_EXCL 原子地创建文件来占用文件名，多线程、多进程同时保存时也不会重名。
+    """
+
+    def __init__(self, directory="Images", extension=".jpg"):
+        self.directory = directory
+        self.extension = extension
+        self._lock = threading.Lock()
+        self._date = None
+        self._counter = 0
+
+    def _scan(self, date_str):
+        """返回目录中当天文件的最大序号"""
+        pattern = re.compile(rf"^{re.escape(date_str)}_AI(\d+)\.\w+$")
+        highest = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                match = pattern.match(entry.name)
+                if match:
+                    highest = max(highest, int(match.group(1)))
+        return highest
+
+    def allocate(self):
+        """占用并返回下一个可用的文件路径（文件已创建，内容为空）"""
+        date_str = datetime.now().strftime("%Y-%m-%d")
+        with self._lock:
+            if date_str != self._date:
+                os.makedirs(self.directory, exist_ok=True)
+                self._date = date_str
+                self._counter = self._scan(date_str)
+            while True:
+                self._counter += 1
+                # 格式化序号为4位数，例如0001, 0002等
+                filename = f"{date_str}_AI{self._counter:04d}{self.extension}"
+                full_path = os.path.join(self.directory, filename)
+                try:
+                    fd = os.open(full_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+                except FileExistsError:
+                    # 其他进程已占用该序号，继续尝试下一个
+                    continue
+                os.close(fd)
+                return full_path
+
+
+_filename_allocator = _SequenceAllocator()
+
+
 def generate_unique_filename():
-    """生成唯一的文件名，格式为：YYYY-MM-DD_AI0001.jpg，序号从0001开始，同名文件存在时序号+1"""
-    # 获取当前日期
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    # 确保Images目录存在
-    os.makedirs("Images", exist_ok=True)
-    
-    # 基础文件名格式
-    base_filename = f"{date_str}_AI"
-    counter = 1
-    
-    # 检查文件是否存在，如果存在则序号+1
-    while True:
-        # 格式化序号为4位数，例如0001, 0002等
-        formatted_counter = f"{counter:04d}"
-        filename = f"{base_filename}{formatted_counter}.jpg"
-        full_path = os.path.join("Images", filename)
-        
-        # 如果文件不存在，则返回该路径
-        if not os.path.exists(full_path):
-            return full_path
-        
-        # 文件存在，序号+1继续尝试
-        counter += 1
+    """生成唯一的文件名，格式为：YYYY-MM-DD_AI0001.jpg，序号从0001开始递增
+
+    返回的文件已被原子地创建（内容为空），调用方直接覆盖写入即可。
+    """
+    return _filename_allocator.allocate()
 
 def save_image(image_data, path=None):
     """保存图像并记录日志
@@ -83,4 +247,22 @@ def save_image(image_data, path=None):
         return True, path
     except Exception as e:
         logging.error(f"图像保存失败: {str(e)}")
-        return False, str(e)
\ No newline at end of file
+        return False, str(e)
+
+def copy_image(src_path, path):
+    """将已保存的图像文件复制到指定路径并记录日志
+
+    参数:
+        src_path (str): 源图像文件路径
+        path (str): 目标路径
+
+    返回:
+        tuple: (成功标志, 保存路径或错误消息)
+    """
+    try:
+        shutil.copyfile(src_path, path)
+        logging.info(f"图像保存成功: {path}")
+        return True, path
+    except Exception as e:
+        logging.error(f"图像保存失败: {str(e)}")
+        return False, str(e)